@@ -1,9 +1,8 @@
 from datetime import datetime
 from bson.objectid import ObjectId
+from pymongo.errors import DuplicateKeyError
 from config.config import MongoClientSingleton
 
-db = MongoClientSingleton.get_db()
-users = db['users']
 
 class MongoUser:
     def __init__(self, user_data):
@@ -12,11 +11,13 @@ class MongoUser:
         self.is_authenticated = True
 
 def get_user_collection():
-    return users
+    # resolved on use, importing this module shouldn't need Mongo
+    return MongoClientSingleton.get_db()['users']
 
 def get_or_create_user_oauth(profile):
     email = profile.get("email")
     username = profile.get("name", email.split("@")[0])
+    users = get_user_collection()
 
     user_data = users.find_one({"email": email})
     if user_data:
@@ -28,6 +29,12 @@ def get_or_create_user_oauth(profile):
         "created_at": datetime.utcnow(),
         "is_oauth": True
     }
-    result = users.insert_one(new_user)
+    try:
+        result = users.insert_one(new_user)
+    except DuplicateKeyError:
+        # Google display names aren't unique, usernames are
+        new_user["username"] = f"{username}_{ObjectId()}"[:64]
+        new_user.pop("_id", None)
+        result = users.insert_one(new_user)
     new_user["_id"] = result.inserted_id
     return MongoUser(new_user)
@@ -0,0 +1,10 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    # Same algorithm as Django's default, with the cost from settings.PASSWORD_HASH_ITERATIONS.
+    # Stored hashes with a different iteration count still verify and are rehashed on login
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
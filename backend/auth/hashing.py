@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from django.conf import settings
+
+from main.metrics import register
+
+logger = logging.getLogger(__name__)
+
+
+class HashingBusy(Exception):
+    pass
+
+
+def _init_worker(settings_module: str):
+    # worker processes are spawned, they need their own Django settings for the hashers
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    import django
+
+    django.setup()
+
+
+def _hash(password: str) -> str:
+    from django.contrib.auth.hashers import make_password
+
+    return make_password(password)
+
+
+def _verify(password: str, encoded: str) -> Tuple[bool, Optional[str]]:
+    # (matches, new hash if the stored one was made with other hasher parameters)
+    from django.contrib.auth.hashers import check_password, make_password
+
+    rehashed = []
+    matches = check_password(password, encoded, setter=lambda raw: rehashed.append(make_password(raw)))
+    return matches, rehashed[0] if rehashed else None
+
+
+# Password hashing pool using singleton principle, one per worker process.
+# PBKDF2 is CPU bound on purpose, so it runs in separate processes (no GIL) instead of the
+# thread pool the sync views and database calls share
+class PasswordHasherPool:
+    _instance = None
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # bounds running + waiting jobs, released when a job finishes
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.rejected = 0
+
+    @classmethod
+    def get_pool(cls):
+        if cls._instance is None:
+            cls._instance = cls(
+                max_workers=settings.PASSWORD_HASH_WORKERS,
+                max_pending=settings.PASSWORD_HASH_QUEUE_SIZE,
+            )
+        return cls._instance
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # started on first use, spawning processes at import would slow every worker boot
+        with self._lock:
+            if self._executor is None:
+                import multiprocessing
+
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(os.environ.get("DJANGO_SETTINGS_MODULE", "main.settings"),),
+                )
+            return self._executor
+
+    def _done(self, _):
+        with self._lock:
+            self.pending -= 1
+        self._slots.release()
+
+    def submit(self, fn, *args) -> asyncio.Future:
+        # Raises HashingBusy instead of letting a login storm queue without limit
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashingBusy(f"{self.max_pending} password hashes already pending")
+        try:
+            job = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.pending += 1
+        job.add_done_callback(self._done)
+        return asyncio.wrap_future(job)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "pending": self.pending,
+                "max_pending": self.max_pending,
+                "rejected": self.rejected,
+            }
+
+
+async def hash_password(password: str) -> str:
+    return await PasswordHasherPool.get_pool().submit(_hash, password)
+
+
+async def verify_password(password: str, encoded: str) -> Tuple[bool, Optional[str]]:
+    """(matches, new hash to store if the hasher parameters changed since it was made)"""
+    return await PasswordHasherPool.get_pool().submit(_verify, password, encoded)
+
+
+@register("password_hashing")
+def hashing_stats() -> dict:
+    return PasswordHasherPool.get_pool().stats()
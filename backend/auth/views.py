@@ -5,27 +5,25 @@ from django.views.decorators.http import require_POST
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
-from django.contrib.auth.hashers import make_password, check_password
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
 from django.shortcuts import redirect
 from django.conf import settings
-from config.config import MongoClientSingleton
+from pymongo.errors import DuplicateKeyError
 from config.token import generate_jwt, decode_jwt
+from user import store
 from .auth_helper import get_or_create_user_oauth
+from .hashing import HashingBusy, hash_password, verify_password
 
 # ----- TODO: I'll implement Google OAuth Later -----
 
 # from google.oauth2 import id_token
 # from google.auth.transport import requests as google_requests
 
-db = MongoClientSingleton.get_db()
-users = db['users']
-
 # ---------------- Regular Registration ----------------
 @csrf_exempt
 @require_POST
-def register_user(request):
+async def register_user(request):
     try:
         data = json.loads(request.body)
         # print("the user: ", data)
@@ -41,12 +39,11 @@ def register_user(request):
         if len(password) < 6:
             raise ValidationError("Password must be at least 6 characters")
 
-        if users.find_one({"username": username}):
-            return JsonResponse({"status": "error", "message": "Username already taken"}, status=409)
-        if users.find_one({"email": email}):
-            return JsonResponse({"status": "error", "message": "Email already registered"}, status=409)
-
-        hashed_password = make_password(password)
+        # hashing is CPU bound, it runs on the password hashing process pool
+        try:
+            hashed_password = await hash_password(password)
+        except HashingBusy:
+            return JsonResponse({"status": "error", "message": "Server busy, please retry"}, status=503)
         user_doc = {
             "username": username,
             "email": email,
@@ -61,8 +58,13 @@ def register_user(request):
             "timezone": "UTC",
         }
         
-        result = users.insert_one(user_doc)
-        user_id = str(result.inserted_id)
+        # unique indexes decide, no lookups before the insert
+        try:
+            user_id = await store.create_user(user_doc)
+        except DuplicateKeyError as exc:
+            if store.duplicate_field(exc) == "email":
+                return JsonResponse({"status": "error", "message": "Email already registered"}, status=409)
+            return JsonResponse({"status": "error", "message": "Username already taken"}, status=409)
 
         access = generate_jwt(user_id, username, email)
         # print(access)
@@ -89,7 +91,7 @@ def register_user(request):
 # ---------------- Login ----------------
 @csrf_exempt
 @require_POST
-def login_user(request):
+async def login_user(request):
     try:
         data = json.loads(request.body)
         username_or_email = data.get("username_or_email", "").strip()
@@ -98,16 +100,22 @@ def login_user(request):
         if not all([username_or_email, password]):
             raise ValidationError("Username/Email and password are required")
 
-        user_data = users.find_one({
-            "$or": [
-                {"username": username_or_email},
-                {"email": username_or_email}
-            ]
-        })
+        user_data = await store.find_by_login(username_or_email)
 
-        if not user_data or not check_password(password, user_data.get("password", "")):
+        if not user_data:
             return JsonResponse({"status": "error", "message": "Invalid credentials"}, status=400)
 
+        try:
+            matches, new_hash = await verify_password(password, user_data.get("password", ""))
+        except HashingBusy:
+            return JsonResponse({"status": "error", "message": "Server busy, please retry"}, status=503)
+        if not matches:
+            return JsonResponse({"status": "error", "message": "Invalid credentials"}, status=400)
+
+        # stored with older hasher parameters, upgrade it now that we have the password
+        if new_hash:
+            await store.update_user(str(user_data["_id"]), {"password": new_hash})
+
         access = generate_jwt(str(user_data["_id"]), user_data["username"], user_data["email"])
 
         response_user = {
@@ -0,0 +1,91 @@
+"""
+Samples/sec one core gets through the audio utilities in voice/audio.py, next to
+what they replace: the per-sample float32 -> int16 loop, and the WAV round trip
+(encode, then parse back with sr.AudioFile) recognize_last used to go through
+before handing PCM to the recognizer.
+
+Run from the backend directory:
+    python -m benchmarks.audio_benchmark [--seconds 10]
+"""
+import argparse
+import io
+import time
+import wave
+
+import numpy as np
+import speech_recognition as sr
+
+from voice.audio import Resampler, downmix, float32_to_int16
+
+CHUNK_MS = 85  # what the console sends, 4096 samples at 48 kHz
+
+
+def legacy_float32_to_int16(pcm_f32):
+    clipped = [max(-1.0, min(1.0, x)) for x in pcm_f32]
+    return b"".join(int((x * 32767.0)).to_bytes(2, "little", signed=True) for x in clipped)
+
+
+def wav_round_trip(pcm: bytes, sample_rate: int):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm)
+    buffer.seek(0)
+    with sr.AudioFile(buffer) as source:
+        return sr.Recognizer().record(source)
+
+
+def raw_audio(pcm: bytes, sample_rate: int):
+    return sr.AudioData(pcm, sample_rate, 2)
+
+
+def chunked(samples, rate):
+    size = rate * CHUNK_MS // 1000
+    return [samples[i:i + size] for i in range(0, len(samples), size)]
+
+
+def rate_of(fn, items, samples):
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return samples / (time.perf_counter() - start)
+
+
+def report(label, rate):
+    print(f"  {label:<34} {rate / 1e6:10.2f} M samples/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    mic = rng.uniform(-1.1, 1.1, 48000 * args.seconds).astype(np.float32)
+    pcm48 = float32_to_int16(mic)
+    print(f"{args.seconds} s of audio in {CHUNK_MS} ms chunks")
+
+    chunks = chunked(mic, 48000)
+    legacy_chunks = chunked(mic[:48000], 48000)  # one second is plenty for the loop
+    report("float32 -> int16, per sample loop", rate_of(legacy_float32_to_int16, legacy_chunks, 48000))
+    report("float32 -> int16, vectorized", rate_of(float32_to_int16, chunks, len(mic)))
+
+    for from_rate in (48000, 44100):
+        pcm = pcm48[:from_rate * args.seconds * 2]
+        resampler = Resampler(from_rate, 16000)
+        items = [bytes(c) for c in chunked(memoryview(pcm).cast("h"), from_rate)]
+        report(f"resample {from_rate} -> 16000", rate_of(resampler.process, items, len(pcm) // 2))
+
+    stereo = [bytes(c) for c in chunked(memoryview(pcm48).cast("h"), 2 * 48000)]
+    report("downmix stereo -> mono (frames)", rate_of(lambda c: downmix(c, 2), stereo, len(pcm48) // 4))
+
+    utterance = pcm48[:16000 * 4 * 2]  # a 4 s utterance at 16 kHz
+    items = [utterance] * 50
+    report("utterance as WAV round trip", rate_of(lambda p: wav_round_trip(p, 16000), items, 50 * len(utterance) // 2))
+    report("utterance as raw PCM", rate_of(lambda p: raw_audio(p, 16000), items, 50 * len(utterance) // 2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Ingress bytes/sec of one active mic per negotiated audio format, and how many
+streams one core can decode. Chunks are the console's: 4096 samples at 48 kHz,
+sent as 1365 samples at 16 kHz. Opus (20 ms packets) is measured when opuslib
+and libopus are installed.
+
+Run from the backend directory:
+    python -m benchmarks.audio_transport_benchmark [--seconds 30]
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "main.settings")
+
+import django
+
+django.setup()
+
+import numpy as np
+
+from benchmarks.vad_benchmark import SAMPLE_RATE, make_pcm
+from voice.transport import AudioReceiver, encode_frame, encode_mulaw, opus_available
+
+CHUNK = 1365
+
+
+def frames(audio_format, pcm):
+    samples = np.frombuffer(pcm, dtype="<i2")
+    if audio_format == "opus":
+        import opuslib
+
+        encoder = opuslib.Encoder(SAMPLE_RATE, 1, opuslib.APPLICATION_VOIP)
+        encoder.bitrate = 16000
+        step = SAMPLE_RATE // 50
+        payloads = [encoder.encode(samples[i:i + step].tobytes(), step)
+                    for i in range(0, len(samples) - step + 1, step)]
+    elif audio_format == "mulaw":
+        payloads = [encode_mulaw(samples[i:i + CHUNK]) for i in range(0, len(samples), CHUNK)]
+    else:
+        payloads = [samples[i:i + CHUNK].tobytes() for i in range(0, len(samples), CHUNK)]
+    return [encode_frame(audio_format, seq, payload) for seq, payload in enumerate(payloads)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=int, default=30)
+    args = parser.parse_args()
+
+    pcm = make_pcm(args.seconds)
+    formats = ["pcm16", "mulaw"] + (["opus"] if opus_available() else [])
+    print(f"{args.seconds} s of 16 kHz mono audio per stream")
+    for audio_format in formats:
+        encoded = frames(audio_format, pcm)
+        receiver = AudioReceiver(audio_format, SAMPLE_RATE)
+        start = time.perf_counter()
+        for frame in encoded:
+            receiver.decode(frame)
+        elapsed = time.perf_counter() - start
+        rate = sum(len(frame) for frame in encoded) / args.seconds
+        print(f"  {audio_format:<6} {rate / 1000:6.1f} KB/s per mic   "
+              f"decode {args.seconds / elapsed:10.0f} streams/core")
+    if "opus" not in formats:
+        print("  opus   skipped, install opuslib and libopus")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Cross-worker device broadcast check over the Redis channel layer and cache.
+
+Two worker processes share one Redis: worker B holds speech sockets, worker A
+applies device changes, and every change must reach every socket on B within
+the latency budget. Exits non-zero when p99 latency goes over it.
+
+Uses REDIS_URL when set, otherwise starts a throwaway redis-server from PATH.
+command/tests.py runs the same check (skipped without Redis).
+Run from the backend directory:
+    python -m benchmarks.broadcast_latency [--sockets 50] [--changes 200] [--budget-ms 50] [--pubsub]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+DEVICES = ("lamp", "fan", "ac", "main")
+HOME = "benchmark"
+
+
+def setup_worker(redis_url, pubsub):
+    # settings read the Redis config from the environment, so it has to be set before django.setup()
+    os.environ["DJANGO_SETTINGS_MODULE"] = "main.settings"
+    os.environ["REDIS_URLS"] = redis_url
+    os.environ["CHANNEL_LAYER_PUBSUB"] = "True" if pubsub else "False"
+    os.environ["SPEECH_RECOGNIZER_BACKEND"] = "stub"
+    # time every change on its own instead of merged broadcasts
+    os.environ["DEVICE_COALESCE_MS"] = "0"
+    os.environ.setdefault("SECRET_KEY", "broadcast-latency-benchmark")
+
+    import django
+
+    django.setup()
+
+
+def receiver(redis_url, pubsub, sockets, changes, ready, results):
+    # worker B: open the sockets and time every device update they receive
+    setup_worker(redis_url, pubsub)
+    from channels.testing import WebsocketCommunicator
+
+    from django.core.cache import cache
+
+    from command.consumer import SpeechConsumer
+    from command.homes import HOME_KEY
+    from config.token import generate_jwt
+    from main.jwt_middleware import JWTAuthMiddleware
+
+    # every socket belongs to the same home, resolved from the shared cache instead of Mongo
+    cache.set(HOME_KEY.format(HOME), HOME)
+
+    async def run():
+        token = generate_jwt(HOME, "benchmark", "benchmark@example.com")
+        app = JWTAuthMiddleware(SpeechConsumer.as_asgi())
+        clients = []
+        for _ in range(sockets):
+            client = WebsocketCommunicator(app, f"/ws/speech/?token={token}")
+            connected, _ = await client.connect()
+            assert connected, "socket was refused"
+            # ready + device snapshot
+            await client.receive_from()
+            await client.receive_from()
+            clients.append(client)
+        ready.set()
+
+        async def collect(client):
+            latencies = []
+            for _ in range(changes):
+                message = json.loads(await client.receive_from(timeout=10))
+                latencies.append(time.time() - message["source_meta"]["sent"])
+            return latencies
+
+        per_socket = await asyncio.gather(*(collect(client) for client in clients))
+        for client in clients:
+            await client.disconnect()
+        return [latency for latencies in per_socket for latency in latencies]
+
+    results.put(asyncio.run(run()))
+
+
+def sender(redis_url, pubsub, changes, interval, ready):
+    # worker A: apply device changes, each carries its send time in the source meta
+    setup_worker(redis_url, pubsub)
+    from asgiref.sync import sync_to_async
+    from channels.layers import get_channel_layer
+    from django.core.cache import cache
+
+    from command.devices import apply_changes
+    from command.homes import HOME_KEY
+
+    async def run():
+        # open the cache and channel layer connections before timing anything
+        await sync_to_async(cache.get)(HOME_KEY.format(HOME))
+        await get_channel_layer().group_send("benchmark_warmup", {"type": "noop"})
+        await asyncio.get_running_loop().run_in_executor(None, ready.wait)
+        for i in range(changes):
+            device = DEVICES[i % len(DEVICES)]
+            await apply_changes(HOME, [(device, i % 2 == 0, {"sent": time.time()})], "benchmark")
+            await asyncio.sleep(interval)
+
+    asyncio.run(run())
+
+
+def redis_available() -> bool:
+    return bool(os.environ.get("REDIS_URL") or shutil.which("redis-server"))
+
+
+def start_redis():
+    # throwaway in-memory redis on a free port, returns (url, process)
+    binary = shutil.which("redis-server")
+    if binary is None:
+        raise RuntimeError("Set REDIS_URL or put redis-server on PATH")
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    workdir = tempfile.mkdtemp()
+    process = subprocess.Popen(
+        [binary, "--port", str(port), "--bind", "127.0.0.1", "--save", "", "--appendonly", "no", "--dir", workdir],
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 5
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError("redis-server did not start")
+            time.sleep(0.05)
+    return f"redis://127.0.0.1:{port}/0", process
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def measure(sockets: int, changes: int, interval: float, pubsub: bool):
+    """Sorted latencies (s) of every delivery, one per socket and change"""
+    redis_url = os.environ.get("REDIS_URL")
+    redis_process = None
+    if not redis_url:
+        redis_url, redis_process = start_redis()
+
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Event()
+    results = ctx.Queue()
+    workers = [
+        ctx.Process(target=receiver, args=(redis_url, pubsub, sockets, changes, ready, results)),
+        ctx.Process(target=sender, args=(redis_url, pubsub, changes, interval, ready)),
+    ]
+    try:
+        for worker in workers:
+            worker.start()
+        latencies = sorted(results.get(timeout=120))
+        for worker in workers:
+            worker.join()
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.kill()
+        if redis_process is not None:
+            redis_process.kill()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sockets", type=int, default=50)
+    parser.add_argument("--changes", type=int, default=200)
+    parser.add_argument("--interval-ms", type=float, default=5)
+    parser.add_argument("--budget-ms", type=float, default=50)
+    parser.add_argument("--pubsub", action="store_true")
+    args = parser.parse_args()
+
+    try:
+        latencies = measure(args.sockets, args.changes, args.interval_ms / 1000, args.pubsub)
+    except RuntimeError as exc:
+        sys.exit(str(exc))
+
+    ms = [latency * 1000 for latency in latencies]
+    p99 = percentile(ms, 0.99)
+    layer = "pubsub" if args.pubsub else "core"
+    print(f"{layer} layer, {args.sockets} sockets on worker B, {args.changes} changes from worker A")
+    print(f"  deliveries {len(ms)}  mean {statistics.mean(ms):.2f} ms  p50 {percentile(ms, 0.5):.2f} ms  "
+          f"p99 {p99:.2f} ms  max {ms[-1]:.2f} ms  (budget {args.budget_ms:.0f} ms)")
+    if len(ms) != args.sockets * args.changes or p99 > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
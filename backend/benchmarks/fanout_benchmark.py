@@ -0,0 +1,84 @@
+"""
+Per-event fan-out cost of device broadcasts with 10k connected sockets:
+one global group that every socket joins vs one group per home.
+
+Sockets are channel-layer channels joined to groups the way SpeechConsumer does,
+each event is one group_send of a device update. The in-memory layer also sweeps
+expired memberships of every group on each send, so what remains of the per-home
+cost grows with the number of homes; the Redis layer only touches the target group.
+
+Run from the backend directory:
+    python -m benchmarks.fanout_benchmark [--sockets 10000] [--per-home 2] [--events 50]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "main.settings")
+
+import django
+
+django.setup()
+
+from channels.layers import InMemoryChannelLayer
+
+from command.broadcast import build_event
+from command.devices import device_group
+
+
+async def join(layer, sockets, home_of):
+    channels = []
+    for i in range(sockets):
+        channel = await layer.new_channel()
+        await layer.group_add(device_group(home_of(i)), channel)
+        channels.append(channel)
+    return channels
+
+
+async def run(sockets, home_of, homes, events):
+    # capacity above the event count so no delivery is dropped
+    layer = InMemoryChannelLayer(capacity=events + 1)
+    channels = await join(layer, sockets, home_of)
+    rng = random.Random(0)
+    timings = []
+    for i in range(events):
+        home = rng.choice(homes)
+        event = build_event([("lamp", i % 2 == 0, None, "benchmark")], i, i + 1)
+        start = time.perf_counter()
+        await layer.group_send(device_group(home), event)
+        timings.append(time.perf_counter() - start)
+    delivered = sum(layer.channels[channel].qsize() for channel in channels if channel in layer.channels)
+    return timings, delivered / events
+
+
+def report(label, timings, per_event):
+    ms = sorted(t * 1000 for t in timings)
+    print(f"  {label:<12} deliveries/event {per_event:>8.0f}   mean {statistics.mean(ms):8.3f} ms   "
+          f"p99 {ms[min(len(ms) - 1, int(len(ms) * 0.99))]:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sockets", type=int, default=10000)
+    parser.add_argument("--per-home", type=int, default=2)
+    parser.add_argument("--events", type=int, default=50)
+    args = parser.parse_args()
+
+    home_count = max(1, args.sockets // args.per_home)
+    print(f"{args.sockets} sockets, {home_count} homes, {args.events} events")
+
+    timings, per_event = asyncio.run(run(args.sockets, lambda i: "all", ["all"], args.events))
+    report("global", timings, per_event)
+    global_mean = statistics.mean(timings)
+
+    homes = [f"home{h}" for h in range(home_count)]
+    timings, per_event = asyncio.run(run(args.sockets, lambda i: homes[i % home_count], homes, args.events))
+    report("per-home", timings, per_event)
+    print(f"  per-home fan-out is {global_mean / statistics.mean(timings):.0f}x cheaper per event")
+
+
+if __name__ == "__main__":
+    main()
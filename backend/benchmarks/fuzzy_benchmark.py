@@ -0,0 +1,87 @@
+"""
+Per-transcript latency of fuzzy command matching with thousands of registered phrases.
+
+Run from the backend directory:
+    python -m benchmarks.fuzzy_benchmark
+"""
+import os
+import random
+import statistics
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "main.settings")
+
+import django
+
+django.setup()
+
+from django.conf import settings
+
+from command.grammar import CommandGrammar
+
+ROOMS = ["kitchen", "bedroom", "garage", "office", "hallway", "basement", "attic", "patio",
+         "porch", "studio", "nursery", "pantry", "laundry", "lobby", "cellar", "den",
+         "library", "gym", "sauna", "closet", "balcony", "garden", "bathroom", "lounge"]
+APPLIANCES = ["lamp", "light", "fan", "heater", "speaker", "kettle", "blinds", "television",
+              "radio", "camera", "sprinkler", "purifier", "humidifier", "charger", "printer",
+              "router", "monitor", "projector", "fountain", "dryer", "washer", "oven",
+              "toaster", "fridge", "freezer", "vacuum", "alarm", "doorbell", "lock", "socket"]
+
+
+def make_devices():
+    devices = {}
+    for room in ROOMS:
+        for appliance in APPLIANCES:
+            name = f"{room}_{appliance}"
+            devices[name] = [f"{room} {appliance}", f"the {room} {appliance}", f"{appliance} in the {room}"]
+    return devices
+
+
+def garble(word, rng):
+    # one phonetic-ish slip per word, like a cloud STT near miss
+    if len(word) < 3:
+        return word + word[-1] if rng.random() < 0.5 else word
+    i = rng.randrange(1, len(word))
+    swaps = {"p": "b", "b": "p", "d": "t", "t": "d", "m": "n", "n": "m", "f": "v", "s": "z"}
+    return word[:i] + swaps.get(word[i], word[i]) + word[i + 1:]
+
+
+def main():
+    devices = make_devices()
+    began = time.perf_counter()
+    grammar = CommandGrammar(devices, settings.VOICE_ACTIONS, settings.VOICE_JOINERS,
+                             settings.VOICE_ALL_DEVICES, fuzzy_threshold=settings.VOICE_FUZZY_THRESHOLD,
+                             cache_size=0)
+    build_ms = (time.perf_counter() - began) * 1000
+    phrases = sum(len(p) + 1 for p in devices.values())
+
+    rng = random.Random(7)
+    transcripts = []
+    for _ in range(2000):
+        room, appliance = rng.choice(ROOMS), rng.choice(APPLIANCES)
+        action = rng.choice(["on", "off"])
+        words = f"turn {action} the {room} {appliance}".split()
+        heard = " ".join(garble(w, rng) if rng.random() < 0.3 else w for w in words)
+        transcripts.append((heard, [(f"{room}_{appliance}", action)]))
+
+    def run():
+        timings = []
+        hits = 0
+        for text, expected in transcripts:
+            t0 = time.perf_counter()
+            intents = grammar.parse(text)
+            timings.append((time.perf_counter() - t0) * 1000)
+            hits += [(i.device, i.action) for i in intents] == expected
+        timings.sort()
+        return hits, statistics.mean(timings), timings[int(len(timings) * 0.99)]
+
+    cold = run()
+    warm = run()
+    print(f"devices: {len(devices)}  phrases: {phrases}  vocabulary words: {len(grammar.fuzzy.words)}")
+    print(f"index build: {build_ms:.1f} ms")
+    print(f"cold cache: correct {cold[0]}/{len(transcripts)}  mean {cold[1]:.3f} ms  p99 {cold[2]:.3f} ms")
+    print(f"warm cache: correct {warm[0]}/{len(transcripts)}  mean {warm[1]:.3f} ms  p99 {warm[2]:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
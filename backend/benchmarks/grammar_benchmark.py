@@ -0,0 +1,94 @@
+"""
+Transcripts/sec and intents/sec of the compiled command grammar against the
+per-utterance dict of substring scans it replaced.
+
+Run from the backend directory:
+    python -m benchmarks.grammar_benchmark
+"""
+import os
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "main.settings")
+
+import django
+
+django.setup()
+
+from django.conf import settings
+
+from command.grammar import CommandGrammar, get_grammar
+
+ROUNDS = 20000
+TRANSCRIPTS = [
+    "turn on the lamp",
+    "lamp off",
+    "fan on",
+    "turn off air conditioner",
+    "lamp on and fan off",
+    "switch main on",
+    "what's the weather like today",
+    "turn on lamp and turn off fan and ac on",
+]
+
+
+def legacy_intents(text):
+    # the dict SpeechConsumer.handle_voice_command used to rebuild for every transcript
+    text_lower = text.lower()
+    device_actions = {
+        'main': {
+            'on': any(cmd in text_lower for cmd in ['main on', 'turn on main', 'switch main on', 'activate main']),
+            'off': any(cmd in text_lower for cmd in ['main off', 'turn off main', 'switch main off', 'deactivate main'])
+        },
+        'lamp': {
+            'on': any(cmd in text_lower for cmd in ['lamp on', 'light on', 'turn on lamp', 'turn on light']),
+            'off': any(cmd in text_lower for cmd in ['lamp off', 'light off', 'turn off lamp', 'turn off light'])
+        },
+        'fan': {
+            'on': any(cmd in text_lower for cmd in ['fan on', 'turn on fan']),
+            'off': any(cmd in text_lower for cmd in ['fan off', 'turn off fan'])
+        },
+        'ac': {
+            'on': any(cmd in text_lower for cmd in ['ac on', 'air conditioner on', 'turn on ac', 'turn on air conditioner']),
+            'off': any(cmd in text_lower for cmd in ['ac off', 'air conditioner off', 'turn off ac', 'turn off air conditioner'])
+        }
+    }
+    intents = []
+    for device, actions in device_actions.items():
+        if actions['on']:
+            intents.append((device, 'on'))
+        elif actions['off']:
+            intents.append((device, 'off'))
+    return intents
+
+
+def measure(parse):
+    intents = 0
+    began = time.perf_counter()
+    for _ in range(ROUNDS):
+        for text in TRANSCRIPTS:
+            intents += len(parse(text))
+    elapsed = time.perf_counter() - began
+    return ROUNDS * len(TRANSCRIPTS) / elapsed, intents / elapsed
+
+
+def main():
+    grammar = get_grammar()
+    for text in TRANSCRIPTS:
+        found = [(i.device, i.action) for i in grammar.parse(text)]
+        print(f"{text!r:45} legacy={legacy_intents(text)} grammar={found}")
+
+    # same grammar without the parsed-transcript cache, every call does the full pass
+    uncached = CommandGrammar(settings.VOICE_DEVICES, settings.VOICE_ACTIONS, settings.VOICE_JOINERS,
+                              settings.VOICE_ALL_DEVICES, settings.VOICE_FUZZY_THRESHOLD, cache_size=0)
+
+    legacy_tps, legacy_ips = measure(legacy_intents)
+    uncached_tps, uncached_ips = measure(uncached.parse)
+    grammar_tps, grammar_ips = measure(grammar.parse)
+    print()
+    print(f"legacy:            {legacy_tps:12,.0f} transcripts/sec {legacy_ips:12,.0f} intents/sec")
+    print(f"grammar (uncached):{uncached_tps:12,.0f} transcripts/sec {uncached_ips:12,.0f} intents/sec")
+    print(f"grammar:           {grammar_tps:12,.0f} transcripts/sec {grammar_ips:12,.0f} intents/sec")
+
+
+if __name__ == "__main__":
+    main()
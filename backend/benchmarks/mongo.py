@@ -0,0 +1,50 @@
+"""
+Shared setup for the benchmarks that need MongoDB: MONGO_URI when set, otherwise a
+throwaway mongod from PATH on a free port. Call setup() before importing app code.
+"""
+import atexit
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def start_mongod():
+    # returns (uri, process)
+    binary = shutil.which("mongod")
+    if binary is None:
+        sys.exit("Set MONGO_URI or put mongod on PATH")
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    process = subprocess.Popen(
+        [binary, "--port", str(port), "--bind_ip", "127.0.0.1", "--dbpath", tempfile.mkdtemp(), "--quiet"],
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 15
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                process.kill()
+                sys.exit("mongod did not start")
+            time.sleep(0.1)
+    return f"mongodb://127.0.0.1:{port}", process
+
+
+def setup(secret_key):
+    if not os.environ.get("MONGO_URI"):
+        os.environ["MONGO_URI"], mongod = start_mongod()
+        atexit.register(mongod.kill)
+    os.environ.setdefault("MONGO_DB_NAME", "hub_benchmark")
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "main.settings")
+    os.environ.setdefault("SECRET_KEY", secret_key)
+
+    import django
+
+    django.setup()
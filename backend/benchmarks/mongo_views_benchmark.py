@@ -0,0 +1,92 @@
+"""
+Requests/sec of the profile endpoint at 500 concurrent clients: the old sync view
+(blocking pymongo, run through Django's sync-to-async thread hop as under ASGI)
+vs the async view on the async Mongo client.
+
+Uses MONGO_URI when set, otherwise starts a throwaway mongod from PATH.
+Run from the backend directory:
+    python -m benchmarks.mongo_views_benchmark [--clients 500] [--requests 5000]
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.mongo import setup
+
+setup("mongo-views-benchmark")
+
+from asgiref.sync import sync_to_async
+from bson import ObjectId
+from django.http import JsonResponse
+from django.test import AsyncRequestFactory
+
+from config.config import MongoClientSingleton
+from config.token import generate_jwt
+from decorators.auth_decorator import jwt_login_required
+from user.views import get_user_profile
+
+
+@jwt_login_required
+def legacy_get_user_profile(request):
+    # the sync view as it was, one blocking find_one per request
+    users = MongoClientSingleton.get_db()["users"]
+    user_data = users.find_one({"_id": ObjectId(request.user_id)})
+    if not user_data:
+        return JsonResponse({"status": "error", "message": "User not found"}, status=404)
+    user_data.pop("password", None)
+    user_data["_id"] = str(user_data["_id"])
+    return JsonResponse({"status": "success", "user": user_data}, status=200)
+
+
+def seed(count):
+    users = MongoClientSingleton.get_db()["users"]
+    users.delete_many({"benchmark": True})
+    docs = [{"username": f"bench{i}", "email": f"bench{i}@example.com", "password": "x",
+             "bio": "Hub User", "theme": "light", "benchmark": True} for i in range(count)]
+    ids = users.insert_many(docs).inserted_ids
+    return [generate_jwt(str(user_id), f"bench{i}", f"bench{i}@example.com") for i, user_id in enumerate(ids)]
+
+
+async def drive(view, tokens, clients, total):
+    factory = AsyncRequestFactory()
+    requests = [
+        factory.get("/api/user/get-profile/", headers={"Authorization": f"Bearer {tokens[i % len(tokens)]}"})
+        for i in range(total)
+    ]
+    remaining = iter(requests)
+
+    async def client():
+        for request in remaining:
+            response = await view(request)
+            assert response.status_code == 200, response.content
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return total / (time.perf_counter() - start)
+
+
+async def measure(view, tokens, clients, total):
+    # warm up the connection pools on the same loop first, the async client is per loop
+    await drive(view, tokens, clients, min(total, 500))
+    return await drive(view, tokens, clients, total)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+
+    tokens = seed(args.users)
+    # Django runs sync views in the one thread-sensitive executor thread under ASGI
+    sync_view = sync_to_async(legacy_get_user_profile, thread_sensitive=True)
+    print(f"{args.clients} concurrent clients, {args.requests} profile requests")
+    for label, view in (("sync view", sync_view), ("async view", get_user_profile)):
+        rate = asyncio.run(measure(view, tokens, args.clients, args.requests))
+        print(f"  {label:<11} {rate:8.0f} req/s")
+    MongoClientSingleton.get_db()["users"].delete_many({"benchmark": True})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+p50/p99 latency of the profile-update endpoint: the old flow (email check, username
+check, update_one, re-read, broadcast) vs the single find_one_and_update.
+Both run on the async Mongo client, each request changes the bio and resends the
+user's own username and email, the path that used to make every round trip.
+
+Uses MONGO_URI when set, otherwise starts a throwaway mongod from PATH.
+Run from the backend directory:
+    python -m benchmarks.profile_update_benchmark [--requests 2000] [--clients 1]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.mongo import setup
+
+setup("profile-update-benchmark")
+
+from bson import ObjectId
+from channels.layers import get_channel_layer
+from django.http import JsonResponse
+from django.test import AsyncRequestFactory
+
+from config.config import MongoClientSingleton
+from config.token import generate_jwt
+from decorators.auth_decorator import jwt_login_required
+from user import store
+from user.indexes import ensure_indexes
+from user.views import update_user_profile
+
+
+@jwt_login_required
+async def legacy_update_user_profile(request):
+    # the view before the single round trip, on the same async client
+    users = store.users()
+    user_id = request.user_id
+    update_data = json.loads(request.body)
+    if await users.find_one({"email": update_data["email"], "_id": {"$ne": ObjectId(user_id)}}):
+        return JsonResponse({"status": "error", "message": "Email already taken"}, status=409)
+    if await users.find_one({"username": update_data["username"], "_id": {"$ne": ObjectId(user_id)}}):
+        return JsonResponse({"status": "error", "message": "Username already taken"}, status=409)
+    result = await users.update_one({"_id": ObjectId(user_id)}, {"$set": update_data})
+    if result.modified_count == 0:
+        return JsonResponse({"status": "error", "message": "No changes made"}, status=400)
+    updated_user = await users.find_one({"_id": ObjectId(user_id)})
+    updated_user.pop("password", None)
+    updated_user["_id"] = str(updated_user["_id"])
+    await get_channel_layer().group_send(f"user_{user_id}", {"type": "profile_update", "user": updated_user})
+    return JsonResponse({"status": "success", "user": updated_user}, status=200)
+
+
+def seed(count):
+    users = MongoClientSingleton.get_db()["users"]
+    ensure_indexes()
+    users.delete_many({"benchmark": True})
+    docs = [{"username": f"bench{i}", "email": f"bench{i}@example.com", "password": "x",
+             "bio": "Hub User", "benchmark": True} for i in range(count)]
+    ids = users.insert_many(docs).inserted_ids
+    return [(generate_jwt(str(user_id), f"bench{i}", f"bench{i}@example.com"), i) for i, user_id in enumerate(ids)]
+
+
+async def run(view, users, total, clients):
+    factory = AsyncRequestFactory()
+    latencies = []
+    counter = iter(range(total))
+
+    async def client():
+        for n in counter:
+            token, i = users[n % len(users)]
+            body = {"bio": f"bio {n}", "username": f"bench{i}", "email": f"bench{i}@example.com"}
+            request = factory.put("/api/user/profile-update/", json.dumps(body), content_type="application/json",
+                                  headers={"Authorization": f"Bearer {token}"})
+            start = time.perf_counter()
+            response = await view(request)
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.content
+
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return sorted(latencies)
+
+
+async def measure(view, users, total, clients):
+    # warm up the pool on the same loop, the async client is per loop
+    await run(view, users, min(total, 200), clients)
+    return await run(view, users, total, clients)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=1)
+    parser.add_argument("--users", type=int, default=200)
+    args = parser.parse_args()
+
+    users = seed(args.users)
+    print(f"{args.requests} profile updates, {args.clients} concurrent clients")
+    for label, view in (("before", legacy_update_user_profile), ("after", update_user_profile)):
+        ms = [t * 1000 for t in asyncio.run(measure(view, users, args.requests, args.clients))]
+        print(f"  {label:<7} p50 {ms[len(ms) // 2]:7.3f} ms   p99 {ms[min(len(ms) - 1, int(len(ms) * 0.99))]:7.3f} ms")
+    MongoClientSingleton.get_db()["users"].delete_many({"benchmark": True})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Speech streams one core can keep up with, VAD per websocket message vs batched
+by the audio scheduler (one feature pass over every stream per tick).
+
+Each stream sends 80 ms of 16 kHz audio per message (the fan room of
+vad_rooms_benchmark, every stream at another point of it), messages of
+different streams are spread over the ticks like real sockets. The work
+measured is what the consumer does with the audio (VAD, utterance buffering),
+not the websocket itself. streams/core = streams * audio seconds / CPU seconds.
+
+Run from the backend directory:
+    python -m benchmarks.speech_batching_benchmark [--streams 300] [--seconds 10] [--tick-ms 20]
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "main.settings")
+
+import django
+
+django.setup()
+
+import numpy as np
+
+from benchmarks.vad_rooms_benchmark import SAMPLE_RATE, room
+from voice.scheduler import AudioScheduler
+from voice.speech import SpeechSession, make_vad
+
+FRAME_MS = 20
+MESSAGE_MS = 80
+
+
+def sessions(count):
+    return [SpeechSession(sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS, max_utterance_ms=10000, preroll_ms=240,
+                          trailing_silence_ms=100, vad=make_vad(SAMPLE_RATE, FRAME_MS)) for _ in range(count)]
+
+
+def schedule(streams, seconds, tick_ms):
+    # per tick, the (stream, chunk) messages arriving in it
+    base = np.frombuffer(room("fan"), dtype="<i2")[:seconds * SAMPLE_RATE]
+    chunk = SAMPLE_RATE * MESSAGE_MS // 1000
+    per_tick = MESSAGE_MS // tick_ms
+    ticks = [[] for _ in range(seconds * 1000 // tick_ms + per_tick)]
+    for stream in range(streams):
+        audio = np.roll(base, stream * 997).tobytes()  # every stream at another point of the audio
+        for n, offset in enumerate(range(0, len(audio), chunk * 2)):
+            ticks[n * per_tick + stream % per_tick].append((stream, audio[offset:offset + chunk * 2]))
+    return ticks
+
+
+def per_message(ticks, streams):
+    live = sessions(streams)
+    utterances = 0
+    start = time.process_time()
+    for messages in ticks:
+        for stream, chunk in messages:
+            if live[stream].add_chunk(chunk):
+                while live[stream].pop_completed_audio() is not None:
+                    utterances += 1
+    return time.process_time() - start, utterances
+
+
+def batched(ticks, streams, tick_ms):
+    live = sessions(streams)
+    scheduler = AudioScheduler(tick_ms)
+    for stream, session in enumerate(live):
+        # registered without add(), ticks are driven here instead of by the loop task,
+        # and the "callback" is the stream number process() hands back
+        scheduler._sessions[session] = stream
+    utterances = 0
+    start = time.process_time()
+    for messages in ticks:
+        for stream, chunk in messages:
+            live[stream].queue_chunk(chunk)
+        for stream, ended in scheduler.process():
+            if ended:
+                while live[stream].pop_completed_audio() is not None:
+                    utterances += 1
+    return time.process_time() - start, utterances
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streams", type=int, default=300)
+    parser.add_argument("--seconds", type=int, default=10)  # up to 30
+    parser.add_argument("--tick-ms", type=int, default=20)
+    args = parser.parse_args()
+
+    ticks = schedule(args.streams, args.seconds, args.tick_ms)
+    audio = args.streams * args.seconds
+    print(f"{args.streams} streams, {args.seconds} s each, {MESSAGE_MS} ms messages, {args.tick_ms} ms ticks")
+    cpu, utterances = per_message(ticks, args.streams)
+    print(f"  per message  {audio / cpu:8.0f} streams/core   ({utterances} utterances)")
+    cpu, utterances = batched(ticks, args.streams, args.tick_ms)
+    print(f"  batched      {audio / cpu:8.0f} streams/core   ({utterances} utterances)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Worker cold start: time from a fresh interpreter importing main.asgi to the response
+of its first HTTP request, the way a server boots a worker (lifespan startup, then
+traffic). Each run is a new process so nothing is cached in memory.
+
+The request is GET /api/metrics/, which needs no database: with Mongo unreachable
+the number must not move, the warm-up runs in the background.
+
+Run from the backend directory:
+    python -m benchmarks.startup_benchmark [--runs 10] [--json]
+--json prints one machine-readable line for CI to track.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+CHILD = r"""
+import time
+start = time.perf_counter()
+import asyncio
+from main.asgi import application
+imported = time.perf_counter()
+
+async def first_request():
+    lifespan = asyncio.Queue()
+    await lifespan.put({"type": "lifespan.startup"})
+    started = asyncio.Event()
+
+    async def lifespan_send(message):
+        started.set()
+
+    asyncio.ensure_future(application({"type": "lifespan"}, lifespan.get, lifespan_send))
+    await started.wait()
+
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+             "scheme": "http", "path": "/api/metrics/", "raw_path": b"/api/metrics/", "query_string": b"",
+             "root_path": "", "headers": [(b"host", b"localhost")], "client": ("127.0.0.1", 1),
+             "server": ("127.0.0.1", 8000)}
+    status = []
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await asyncio.Event().wait()  # no disconnect, the client waits for the reply
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await application(scope, receive, send)
+    return status[0]
+
+status = asyncio.run(first_request())
+done = time.perf_counter()
+print(status, imported - start, done - start)
+"""
+
+
+def run_once(env):
+    out = subprocess.run([sys.executable, "-c", CHILD], env=env, capture_output=True, text=True, check=True)
+    status, imported, first = out.stdout.split()[-3:]
+    assert status == "200", out.stdout + out.stderr
+    return float(imported), float(first)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SETTINGS_MODULE", "main.settings")
+    env.setdefault("SECRET_KEY", "startup-benchmark")
+    env.setdefault("MONGO_DB_NAME", "hub_benchmark")
+    env["METRICS_ENABLED"] = "True"
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+
+    run_once(env)  # bytecode compiled and files in the page cache, like a restart
+    imports, firsts = zip(*(run_once(env) for _ in range(args.runs)))
+    result = {
+        "runs": args.runs,
+        "import_ms": round(statistics.median(imports) * 1000, 1),
+        "first_request_ms": round(statistics.median(firsts) * 1000, 1),
+        "first_request_max_ms": round(max(firsts) * 1000, 1),
+    }
+    if args.json:
+        print(json.dumps(result))
+        return
+    print(f"{args.runs} cold starts (median)")
+    print(f"  import main.asgi       {result['import_ms']:8.1f} ms")
+    print(f"  import to first reply  {result['first_request_ms']:8.1f} ms   (max {result['first_request_max_ms']} ms)")
+
+
+if __name__ == "__main__":
+    main()
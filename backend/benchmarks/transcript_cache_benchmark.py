@@ -0,0 +1,90 @@
+"""
+What the transcript cache answers, and what it costs per utterance. A user's commands
+are synthetic words (harmonic bursts, each word its own pitch contour, timbre and
+syllable rate), long and short ones; every word is recognized once, then said again as an exact replay,
+at another gain, and with background noise at falling SNRs. "false" counts hits on a
+word the user never said. The cost is fingerprinting plus lookup against a full
+per-user cache, on the event loop.
+
+Run from the backend directory:
+    python -m benchmarks.transcript_cache_benchmark [--words 50] [--min-similarity 0.97]
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "main.settings")
+
+import django
+
+django.setup()
+
+import numpy as np
+
+from voice.transcript_cache import TranscriptCache, fingerprint
+
+SAMPLE_RATE = 16000
+
+
+def word(seed, seconds=1.2):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    f0 = rng.uniform(110, 200) + rng.uniform(10, 40) * np.sin(2 * np.pi * rng.uniform(0.5, 2) * t)
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+    timbre = rng.uniform(0.2, 1, 19)
+    voiced = sum(timbre[k - 1] * np.sin(k * phase) / k for k in range(1, 20))
+    return voiced * np.clip(np.sin(2 * np.pi * rng.uniform(3, 5) * t + rng.uniform(0, 6)), 0.15, None)
+
+
+def take(signal, rms=0.1, noise=0.0, seed=0):
+    # the word in an utterance as the VAD cuts it: some silence before and after, mic noise
+    rng = np.random.default_rng(seed)
+    audio = np.concatenate((np.zeros(int(0.3 * SAMPLE_RATE)), signal * rms / np.sqrt(np.mean(signal ** 2)),
+                            np.zeros(int(0.2 * SAMPLE_RATE))))
+    audio += rng.normal(0, max(noise, 0.0005), len(audio))
+    return (np.clip(audio, -1, 1) * 32767).astype("<i2").tobytes()
+
+
+def run(seconds, args):
+    cache = TranscriptCache(max_entries=5000, per_key=args.words, min_similarity=args.min_similarity,
+                            min_confidence=0.85)
+    words = [word(seed, seconds) for seed in range(args.words)]
+    for n, signal in enumerate(words):
+        cache.store("user", fingerprint(take(signal), SAMPLE_RATE), f"word {n}", 0.95, 0.5)
+
+    print(f"{args.words} words of {seconds} s cached, min similarity {args.min_similarity}")
+    cases = [("exact replay", {"seed": 0}), ("3x louder", {"rms": 0.3}), ("2x quieter", {"rms": 0.05}),
+             ("noise, 26 dB SNR", {"noise": 0.005}), ("noise, 14 dB SNR", {"noise": 0.02}),
+             ("noise, 8 dB SNR", {"noise": 0.04})]
+    for label, options in cases:
+        hits = wrong = 0
+        for n, signal in enumerate(words):
+            text = cache.lookup("user", fingerprint(take(signal, **{"seed": n + 1, **options}), SAMPLE_RATE))
+            hits += text == f"word {n}"
+            wrong += text is not None and text != f"word {n}"
+        print(f"  {label:<18} hit {hits:3}/{len(words)}   wrong {wrong}")
+
+    others = [take(word(seed, seconds)) for seed in range(10000, 10000 + args.words * 4)]
+    false = sum(cache.lookup("user", fingerprint(pcm, SAMPLE_RATE)) is not None for pcm in others)
+    print(f"  {'unseen words':<18} false {false:3}/{len(others)}")
+
+    start = time.perf_counter()
+    for pcm in others:
+        cache.lookup("user", fingerprint(pcm, SAMPLE_RATE))
+    print(f"  fingerprint + lookup {(time.perf_counter() - start) / len(others) * 1000:.2f} ms per utterance")
+    print(f"  {cache.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--words", type=int, default=50)
+    parser.add_argument("--min-similarity", type=float, default=0.97)
+    args = parser.parse_args()
+
+    # commands as long as "turn the lamp on" and as short as "stop" (fewer frames than slices)
+    for seconds in (1.2, 0.4):
+        run(seconds, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Frames/sec one core can push through the VAD, before and after batching.
+
+Run from the backend directory:
+    python -m benchmarks.vad_benchmark
+"""
+import math
+import time
+
+import numpy as np
+
+from voice.speech import SimpleVAD
+
+SAMPLE_RATE = 16000
+FRAME_MS = 20
+SECONDS = 30
+
+
+def make_pcm(seconds: int, sample_rate: int = SAMPLE_RATE) -> bytes:
+    # alternating bursts of "speech" (loud noise) and near silence
+    rng = np.random.default_rng(1234)
+    n = seconds * sample_rate
+    audio = rng.normal(0, 60, n)
+    burst = sample_rate // 2
+    for begin in range(0, n, burst * 3):
+        audio[begin:begin + burst] = rng.normal(0, 4000, len(audio[begin:begin + burst]))
+    return np.clip(audio, -32768, 32767).astype("<i2").tobytes()
+
+
+class LegacyVAD(SimpleVAD):
+    # the per-sample loop SimpleVAD used before, kept here as the baseline
+    def _rms(self, frame_i16: bytes) -> float:
+        n = len(frame_i16) // 2
+        if n == 0:
+            return 0.0
+        total = 0.0
+        for i in range(0, len(frame_i16), 2):
+            s = int.from_bytes(frame_i16[i:i+2], "little", signed=True)
+            total += (s * s)
+        return math.sqrt(total / n) / 32768.0
+
+
+def run_legacy(pcm: bytes, chunk_bytes: int):
+    vad = LegacyVAD(sr=SAMPLE_RATE, frame_ms=FRAME_MS)
+    frame_bytes = vad.frame_size * 2
+    decisions = []
+    for offset in range(0, len(pcm), chunk_bytes):
+        chunk = pcm[offset:offset + chunk_bytes]
+        for pos in range(0, len(chunk) - frame_bytes + 1, frame_bytes):
+            decisions.append(vad.update(chunk[pos:pos + frame_bytes]))
+    return decisions
+
+
+def run_batched(pcm: bytes, chunk_bytes: int):
+    vad = SimpleVAD(sr=SAMPLE_RATE, frame_ms=FRAME_MS)
+    view = memoryview(pcm)
+    decisions = []
+    for offset in range(0, len(pcm), chunk_bytes):
+        decisions.extend(vad.update_many(view[offset:offset + chunk_bytes]))
+    return decisions
+
+
+def measure(fn, pcm: bytes, chunk_bytes: int):
+    began = time.perf_counter()
+    decisions = fn(pcm, chunk_bytes)
+    elapsed = time.perf_counter() - began
+    return decisions, len(decisions) / elapsed
+
+
+def main():
+    pcm = make_pcm(SECONDS)
+    frame_bytes = int(SAMPLE_RATE * FRAME_MS / 1000) * 2
+    chunk_bytes = frame_bytes * 8  # ~160 ms of audio per websocket message
+
+    legacy, legacy_fps = measure(run_legacy, pcm, chunk_bytes)
+    batched, batched_fps = measure(run_batched, pcm, chunk_bytes)
+
+    if legacy != batched:
+        raise SystemExit("batched VAD decisions differ from the legacy VAD")
+
+    print(f"frames:   {len(legacy)} ({SECONDS}s of audio, {chunk_bytes} byte chunks)")
+    print(f"legacy:   {legacy_fps:12,.0f} frames/sec")
+    print(f"batched:  {batched_fps:12,.0f} frames/sec")
+    print(f"speedup:  {batched_fps / legacy_fps:12.1f}x")
+
+
+if __name__ == "__main__":
+    main()
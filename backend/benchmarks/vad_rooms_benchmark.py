@@ -0,0 +1,108 @@
+"""
+Utterances and seconds of audio sent to the recognizer per room, with the fixed
+0.01 RMS VAD and the adaptive one. Rooms are synthetic, 30 s each with four
+spoken commands (harmonic bursts with a syllable envelope):
+  quiet       near silent mic, a breath (broadband noise) every 2.5 s
+  fan         steady low-frequency fan noise above the fixed threshold
+  ac-on       quiet, then an AC starts half way through
+Recognition is paid per utterance and per second, so fewer false utterances and
+shorter ones cost less. "hit" counts the commands an utterance overlaps.
+
+Run from the backend directory:
+    python -m benchmarks.vad_rooms_benchmark
+"""
+import os
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "main.settings")
+
+import django
+
+django.setup()
+
+import numpy as np
+
+from voice.speech import SimpleVAD, SpeechSession, make_vad
+
+SAMPLE_RATE = 16000
+FRAME_MS = 20
+SECONDS = 30
+COMMANDS = [(3.0, 1.2), (10.0, 1.5), (17.0, 1.0), (24.0, 1.4)]  # (start s, length s)
+
+
+def rms_scaled(signal, rms):
+    return signal * (rms / np.sqrt(np.mean(signal ** 2)))
+
+
+def speech(rng, seconds, rms):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    f0 = 140 + 20 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 20))
+    syllables = np.clip(np.sin(2 * np.pi * 4 * t), 0.15, None)  # dips between syllables
+    return rms_scaled(voiced * syllables + rng.normal(0, 0.05, len(t)), rms)
+
+
+def fan(rng, n, rms):
+    # low-passed noise with a hum, most of its energy well under 500 Hz
+    noise = np.convolve(rng.normal(0, 1, n), np.ones(64) / 64, mode="same")
+    hum = np.sin(2 * np.pi * 100 * np.arange(n) / SAMPLE_RATE)
+    return rms_scaled(noise + 0.3 * hum, rms)
+
+
+def room(name, seed=7):
+    rng = np.random.default_rng(seed)
+    n = SECONDS * SAMPLE_RATE
+    audio = rng.normal(0, 1, n) * 0.0008 * 32768  # mic self-noise
+    if name == "quiet":
+        for begin in np.arange(1.0, SECONDS, 2.5):
+            i = int(begin * SAMPLE_RATE)
+            breath = rng.normal(0, 1, int(0.5 * SAMPLE_RATE)) * np.hanning(int(0.5 * SAMPLE_RATE))
+            audio[i:i + len(breath)] += rms_scaled(breath, 0.014)[:n - i] * 32768
+        level = 0.06
+    elif name == "fan":
+        audio += fan(rng, n, 0.03) * 32768
+        level = 0.12
+    else:
+        half = n // 2
+        audio[half:] += fan(rng, n - half, 0.03) * 32768
+        level = 0.1
+    for begin, length in COMMANDS:
+        i = int(begin * SAMPLE_RATE)
+        utterance = speech(rng, length, level) * 32768
+        audio[i:i + len(utterance)] += utterance
+    return np.clip(audio, -32768, 32767).astype("<i2").tobytes()
+
+
+def run(pcm, vad):
+    session = SpeechSession(sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS, max_utterance_ms=10000,
+                            preroll_ms=240, trailing_silence_ms=100, vad=vad)
+    chunk = SAMPLE_RATE * 85 // 1000 * 2
+    utterances = []
+    for offset in range(0, len(pcm), chunk):
+        if session.add_chunk(pcm[offset:offset + chunk]):
+            end = (offset + chunk) / 2 / SAMPLE_RATE
+            while session.has_completed():
+                length = len(session.pop_completed_audio()) / 2 / SAMPLE_RATE
+                utterances.append((end - length, length))
+    hits = sum(any(u_start < c_start + c_len and c_start < u_start + u_len + 0.7 for u_start, u_len in utterances)
+               for c_start, c_len in COMMANDS)
+    return utterances, hits
+
+
+def main():
+    print(f"{SECONDS} s per room, {len(COMMANDS)} commands each")
+    for name in ("quiet", "fan", "ac-on"):
+        pcm = room(name)
+        for label, vad in (("fixed", SimpleVAD(sr=SAMPLE_RATE, frame_ms=FRAME_MS, threshold=0.01)),
+                           ("adaptive", make_vad(SAMPLE_RATE, FRAME_MS))):
+            start = time.perf_counter()
+            utterances, hits = run(pcm, vad)
+            elapsed = time.perf_counter() - start
+            audio = sum(length for _, length in utterances)
+            print(f"  {name:<6} {label:<9} utterances {len(utterances):3}   hit {hits}/{len(COMMANDS)}   "
+                  f"audio sent {audio:5.1f} s   {SECONDS / elapsed:7.0f}x realtime")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import asyncio
+import json
+import threading
+from collections import deque
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+
+# (device, state, source_meta, source)
+Update = Tuple[str, bool, Optional[dict], str]
+
+
+def build_event(updates: Iterable[Update], since: int, version: int) -> dict:
+    """
+    Channel-layer message carrying the client frame already encoded, so it is
+    serialized once per broadcast instead of once per socket.
+    The frame covers the versions after `since` up to `version`
+    """
+    updates = list(updates)
+    if len(updates) == 1:
+        device, state, meta, source = updates[0]
+        frame = {"type": "device_update", "device": device, "state": state, "source": source}
+        if meta:
+            frame["source_meta"] = meta
+    else:
+        items = []
+        for device, state, meta, source in updates:
+            item = {"device": device, "state": state, "source": source}
+            if meta:
+                item["source_meta"] = meta
+            items.append(item)
+        frame = {"type": "device_updates", "updates": items, "source": updates[-1][3]}
+    frame["since"] = since
+    frame["version"] = version
+    return {"type": "device.frame", "text": json.dumps(frame), "version": version}
+
+
+class Batch:
+    # updates of consecutive versions of one group, last update to a device wins
+    __slots__ = ("since", "version", "updates")
+
+    def __init__(self, since: int):
+        self.since = since
+        self.version = since
+        self.updates: Dict[str, Update] = {}
+
+
+class Coalescer:
+    """
+    Merges the device updates sent to a group within a short window into one broadcast.
+    The first publish for a group waits out the window and sends everything that
+    arrived meanwhile, the others return right away. Only consecutive versions are
+    merged: a version from another worker in between flushes what is pending first,
+    so a frame never claims versions it doesn't contain.
+    Shared by every thread and event loop of the process, hence the lock.
+    """
+
+    def __init__(self, window_ms: int):
+        self.window = window_ms / 1000
+        self._pending: Dict[str, Batch] = {}
+        self._lock = threading.Lock()
+
+    async def publish(self, group: str, updates: Iterable[Update], version: int, channel_layer):
+        if self.window <= 0:
+            batch = Batch(version - 1)
+            self._merge(batch, updates, version)
+            await self._send(group, batch, channel_layer)
+            return
+
+        with self._lock:
+            batch = self._pending.get(group)
+            stale = None
+            if batch is not None and version != batch.version + 1:
+                stale = self._pending.pop(group)
+                batch = None
+            leader = batch is None
+            if leader:
+                batch = self._pending[group] = Batch(version - 1)
+            self._merge(batch, updates, version)
+
+        if stale is not None:
+            await self._send(group, stale, channel_layer)
+        if not leader:
+            return
+
+        await asyncio.sleep(self.window)
+        with self._lock:
+            if self._pending.get(group) is not batch:
+                # already flushed by a publish that didn't follow on
+                return
+            del self._pending[group]
+        await self._send(group, batch, channel_layer)
+
+    @staticmethod
+    def _merge(batch: Batch, updates: Iterable[Update], version: int):
+        for update in updates:
+            batch.updates.pop(update[0], None)  # keep the order updates last happened in
+            batch.updates[update[0]] = update
+        batch.version = version
+
+    @staticmethod
+    async def _send(group: str, batch: Batch, channel_layer):
+        await channel_layer.group_send(group, build_event(batch.updates.values(), batch.since, batch.version))
+
+
+class SendQueue:
+    """
+    Bounded queue of encoded frames for one socket, drained by a task that only
+    runs while there is something to send. When a slow client lets it fill up:
+      "drop_oldest": the oldest frame goes, the client sees a version gap and resyncs
+      "snapshot": everything queued goes and a fresh snapshot is sent instead
+    """
+
+    def __init__(self, send: Callable[[str], Awaitable], resync: Callable[[], Awaitable],
+                 limit: int, policy: str = "snapshot"):
+        self.send = send
+        self.resync = resync
+        self.limit = limit
+        self.policy = policy
+        self.frames = deque()
+        self.needs_resync = False
+        self.dropped = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def put(self, text: str):
+        if len(self.frames) >= self.limit:
+            if self.policy == "drop_oldest":
+                self.frames.popleft()
+                self.dropped += 1
+            else:
+                self.dropped += len(self.frames)
+                self.frames.clear()
+                self.needs_resync = True
+        self.frames.append(text)
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._drain())
+
+    async def _drain(self):
+        try:
+            while self.frames or self.needs_resync:
+                if self.needs_resync:
+                    # frames queued after the snapshot is read are older or equal, the client skips them
+                    self.needs_resync = False
+                    await self.resync()
+                    continue
+                await self.send(self.frames.popleft())
+        finally:
+            self._task = None
+
+    def close(self):
+        self.frames.clear()
+        if self._task is not None:
+            self._task.cancel()
+
+
+_coalescer: Optional[Coalescer] = None
+
+
+def get_coalescer() -> Coalescer:
+    # Process-wide, every publish for a group in this worker goes through it
+    global _coalescer
+    if _coalescer is None:
+        _coalescer = Coalescer(settings.DEVICE_COALESCE_MS)
+    return _coalescer
@@ -1,26 +1,31 @@
 import json
+import time
+from functools import partial
 from channels.generic.websocket import AsyncWebsocketConsumer
-from voice.speech import SpeechSession
-from django.core.cache import cache
+from voice.speech import SpeechSession, make_vad, recognize_pcm, recognize_pcm_scored
+from voice.executor import SessionRecognizer, RecognitionQueueFull
+from voice.recognizers import get_recognizer
+from voice.transport import AudioFormatError, AudioReceiver, available_formats, negotiate
+from voice.audio import PCMConverter, input_format
+from voice.scheduler import get_scheduler
+from voice.transcript_cache import fingerprint, get_transcript_cache
+from .grammar import get_grammar
+from .devices import apply_changes, device_group, get_deltas, get_snapshot
+from .homes import get_home_id, member_group
+from .broadcast import SendQueue
+from django.conf import settings
 from asgiref.sync import sync_to_async
-from config.token import decode_jwt
 import urllib.parse
 
 class SpeechConsumer(AsyncWebsocketConsumer):
     async def connect(self):
-        # Extract token from query parameters
         query_string = self.scope.get('query_string', b'').decode()
         query_params = urllib.parse.parse_qs(query_string)
-        token = query_params.get('token', [None])[0]
         
-        if not token:
-            await self.close(code=4001)  # Custom close code for authentication failure
-            return
-        
-        # Verify JWT token
-        payload = decode_jwt(token)
+        # Token from the query string, already verified by JWTAuthMiddleware
+        payload = self.scope.get('token_claims')
         if not payload:
-            await self.close(code=4001)
+            await self.close(code=4001)  # Custom close code for authentication failure
             return
         
         # Store user information
@@ -29,35 +34,99 @@ class SpeechConsumer(AsyncWebsocketConsumer):
         
         await self.accept()
         
-        # Add to device_updates group
-        self.group_name = "device_updates"
+        # Join the device group of the user's home (their own, or a home shared with them),
+        # and the user's member group first so a change of home while connecting isn't missed
+        self.member_group = member_group(self.user_id)
+        await self.channel_layer.group_add(self.member_group, self.channel_name)
+        self.home = await sync_to_async(get_home_id)(self.user_id)
+        self.group_name = device_group(self.home)
+        # device frames arrive encoded, a bounded queue keeps a slow client from piling them up
+        self.outbox = SendQueue(self.send, self.send_device_states, settings.DEVICE_SEND_QUEUE_LIMIT,
+                                settings.DEVICE_SEND_QUEUE_POLICY)
         await self.channel_layer.group_add(self.group_name, self.channel_name)
         
-        # instance of the SpeechSession class
-        self.session = SpeechSession(sample_rate=16000, frame_ms=20)
+        # Recognizer backend is built once per process (may load a model, so off the loop)
+        self.backend = await sync_to_async(get_recognizer)()
+        
+        # instance of the SpeechSession class, partials only if the backend can stream
+        partial_ms = settings.SPEECH_PARTIAL_INTERVAL_MS if self.backend.supports_streaming else 0
+        self.session = SpeechSession(sample_rate=16000, frame_ms=20, partial_ms=partial_ms,
+                                     max_utterance_ms=settings.SPEECH_MAX_UTTERANCE_MS,
+                                     preroll_ms=settings.SPEECH_PREROLL_MS,
+                                     trailing_silence_ms=settings.SPEECH_TRAILING_SILENCE_MS,
+                                     vad=make_vad(sample_rate=16000, frame_ms=20))
+        # with batching on, the VAD of every socket of the worker runs together each tick
+        self.scheduler = get_scheduler()
+        if self.scheduler is not None:
+            self.scheduler.add(self.session, self.handle_frames)
         self.lang = "en-US"
+        # framed audio in the format asked for in the handshake (?audio=opus,mulaw,pcm16),
+        # bare PCM for clients that don't ask
+        audio_format = negotiate(query_params.get('audio', [None])[0])
+        self.audio = AudioReceiver(audio_format, self.session.sample_rate) if audio_format else None
+        # PCM may come at another rate or in stereo (?rate=48000&channels=2), opus decodes to the session's
+        rate, channels = self.session.sample_rate, 1
+        if audio_format != "opus":
+            rate, channels = input_format(query_params.get('rate', [None])[0],
+                                          query_params.get('channels', [None])[0], self.session.sample_rate)
+        self.converter = PCMConverter(rate, channels, self.session.sample_rate) \
+            if (rate, channels) != (self.session.sample_rate, 1) else None
+        # transcription runs on the recognition pool, results come back in order
+        self.recognizer = SessionRecognizer(on_result=self.handle_transcript)
+        self.stream = None # RecognitionStream of the utterance in progress
+        self.partial_pending = False
+        self.last_partial_at = 0.0
+        self.last_partial_text = ""
         await self.send(json.dumps({
             "type": "ready",
-            "message": "Websocket connected"
+            "message": "Websocket connected",
+            "audio": {"format": audio_format or "pcm16", "framed": audio_format is not None,
+                      "formats": available_formats(), "sample_rate": rate, "channels": channels},
         }))
+        
+        # Current device states in one message, or only what changed if the client
+        # reconnects with the last version it saw of this home (?home=<id>&since=<version>)
+        since = query_params.get('since', [None])[0]
+        if query_params.get('home', [None])[0] != self.home or not (since and since.isdigit()):
+            since = None
+        await self.send_device_states(int(since) if since else None)
 
     async def disconnect(self, close_code):
         # Only try to discard if we were added to the group
         if hasattr(self, 'group_name'):
             await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        if hasattr(self, 'member_group'):
+            await self.channel_layer.group_discard(self.member_group, self.channel_name)
+        # Stop any transcription still pending for this socket
+        if hasattr(self, 'recognizer'):
+            await self.recognizer.close()
+        if hasattr(self, 'outbox'):
+            self.outbox.close()
+        if getattr(self, 'scheduler', None) is not None:
+            self.scheduler.remove(self.session)
         print("Websocket disconnected: ", close_code)
 
     async def receive(self, text_data=None, bytes_data=None):
         if bytes_data:
-            ended = self.session.add_chunk(bytes_data)
+            if self.audio is not None:
+                try:
+                    bytes_data, missing = self.audio.decode(bytes_data)
+                except AudioFormatError as exc:
+                    await self.send(json.dumps({"type": "status", "message": f"Invalid audio frame: {exc}"}))
+                    return
+                if missing:
+                    # lost on the way, the utterance goes on without them
+                    await self.send(json.dumps({"type": "audio_gap", "missing": missing}))
+                if not bytes_data:
+                    return  # late frame, the audio after it was already used
+            if self.converter is not None:
+                bytes_data = self.converter.convert(bytes_data)
             
-            if ended:
-                await self.send(json.dumps({"type": "status", "message": "Transcribing..."}))
-                text = self.session.recognize_last(lang=self.lang) or ""
-                await self.send(json.dumps({"type": "final", "text": text}))
-                
-                # Handle voice commands and control devices
-                await self.handle_voice_command(text)
+            if self.scheduler is not None:
+                self.session.queue_chunk(bytes_data) # handle_frames is called on the next tick
+                return
+            
+            await self.handle_frames(self.session.add_chunk(bytes_data))
                 
         elif text_data:
             try:
@@ -65,64 +134,132 @@ class SpeechConsumer(AsyncWebsocketConsumer):
                 if data.get("type") == "lang":
                     self.lang = data.get("value", "en-US")
                     await self.send(json.dumps({"type": "status", "message": f"Language set: {self.lang}"}))
+                elif data.get("type") == "resync":
+                    since = data.get("since")
+                    await self.send_device_states(since if isinstance(since, int) else None)
                 else:
                     await self.send(json.dumps({"type": "status", "message": f"Unknown control: {data}"}))
             except:
                 await self.send(json.dumps({"type": "status", "message": "Invalid JSON"}))
     
-    async def handle_voice_command(self, text):
-        """Process voice commands and control devices"""
-        text_lower = text.lower()
+    async def handle_frames(self, ended):
+        """Act on the audio the VAD just went through"""
+        if ended:
+            # one message or tick can finish more than one utterance
+            while self.session.has_completed():
+                await self.submit_utterance()
+        
+        await self.submit_partial()
+    
+    async def submit_utterance(self):
+        """Queue the finished utterance for recognition"""
+        streamed = self.session.completed_streamed
+        audio = self.session.pop_completed_audio()
+        stream, self.stream = self.stream, None
+        if stream is not None:
+            # the stream already holds everything up to the last partial, send only the rest
+            stream.push(audio[streamed:])
+        cache = get_transcript_cache()
+        try:
+            # Don't block the event loop, keep taking frames while this is transcribed
+            if cache is not None:
+                self.submit_cached(cache, audio, stream)
+            elif stream is not None:
+                self.recognizer.submit(stream.finish)
+            else:
+                self.recognizer.submit(recognize_pcm, audio, self.session.sample_rate, self.lang)
+        except RecognitionQueueFull:
+            await self.send(json.dumps({"type": "status", "message": "Recognizer busy, please repeat"}))
+        else:
+            await self.send(json.dumps({"type": "status", "message": "Transcribing..."}))
+    
+    def submit_cached(self, cache, audio, stream):
+        """Answer a repeat of something this user said from the cache, recognize (and keep) the rest"""
+        key = (self.user_id, self.lang)
+        fp = fingerprint(audio, self.session.sample_rate)
+        text = cache.lookup(key, fp)
+        if text is not None:
+            self.recognizer.submit_result(text)
+        elif stream is not None:
+            self.recognizer.submit(cache.remember, key, fp, lambda: (stream.finish(), stream.confidence))
+        else:
+            self.recognizer.submit(cache.remember, key, fp,
+                                   partial(recognize_pcm_scored, audio, self.session.sample_rate, self.lang))
+    
+    async def submit_partial(self):
+        """Feed new in-progress audio to the stream and schedule a rate limited partial decode"""
+        audio = self.session.pop_partial_audio()
+        if audio is None:
+            return
         
-        # Map voice commands to device actions
-        device_actions = {
-            'main': {
-                'on': any(cmd in text_lower for cmd in ['main on', 'turn on main', 'switch main on', 'activate main']),
-                'off': any(cmd in text_lower for cmd in ['main off', 'turn off main', 'switch main off', 'deactivate main'])
-            },
-            'lamp': {
-                'on': any(cmd in text_lower for cmd in ['lamp on', 'light on', 'turn on lamp', 'turn on light']),
-                'off': any(cmd in text_lower for cmd in ['lamp off', 'light off', 'turn off lamp', 'turn off light'])
-            },
-            'fan': {
-                'on': any(cmd in text_lower for cmd in ['fan on', 'turn on fan']),
-                'off': any(cmd in text_lower for cmd in ['fan off', 'turn off fan'])
-            },
-            'ac': {
-                'on': any(cmd in text_lower for cmd in ['ac on', 'air conditioner on', 'turn on ac', 'turn on air conditioner']),
-                'off': any(cmd in text_lower for cmd in ['ac off', 'air conditioner off', 'turn off ac', 'turn off air conditioner'])
-            }
-        }
+        if self.stream is None:
+            self.stream = self.backend.open_stream(self.session.sample_rate, self.lang)
+        self.stream.push(audio)
         
-        # Process each device command
-        for device, actions in device_actions.items():
-            if actions['on']:
-                await self.control_device(device, True, "voice")
-            elif actions['off']:
-                await self.control_device(device, False, "voice")
+        # One decode in flight at a time and a minimum gap between them,
+        # audio pushed meanwhile is picked up by the next decode or by finish()
+        now = time.monotonic()
+        if self.partial_pending or (now - self.last_partial_at) * 1000 < settings.SPEECH_PARTIAL_MIN_GAP_MS:
+            return
+        try:
+            self.recognizer.submit(self.stream.decode, on_result=self.handle_partial)
+        except RecognitionQueueFull:
+            return
+        self.partial_pending = True
+        self.last_partial_at = now
     
-    async def control_device(self, device, state, source):
-        """Control a device and broadcast the update"""
-        # Store device state in cache
-        # (I'll use Redis later in production, for now it's InMemoryLayer)
-        await sync_to_async(cache.set)(f"device_{device}", state, timeout=None)
+    async def handle_partial(self, text):
+        """Deliver an in-progress transcript, skipped if unchanged or the utterance already ended"""
+        self.partial_pending = False
+        if not text or text == self.last_partial_text:
+            return
+        self.last_partial_text = text
+        await self.send(json.dumps({"type": "partial", "text": text}))
+    
+    async def handle_transcript(self, text):
+        """Deliver a finished transcript, called in utterance order"""
+        text = text or ""
+        self.last_partial_text = ""
+        await self.send(json.dumps({"type": "final", "text": text}))
         
-        # Broadcast to all connected clients
-        await self.channel_layer.group_send(
-            "device_updates",
-            {
-                "type": "device.update",
-                "device": device,
-                "state": state,
-                "source": source
-            }
-        )
+        # Handle voice commands and control devices
+        await self.handle_voice_command(text)
     
-    async def device_update(self, event):
-        """Receive device update broadcasts"""
-        await self.send(json.dumps({
-            "type": "device_update",
-            "device": event["device"],
-            "state": event["state"],
-            "source": event["source"]
-        }))
\ No newline at end of file
+    async def handle_voice_command(self, text):
+        """Process voice commands and control devices, in the order they were spoken"""
+        # fuzzy matches report their score and what was heard
+        changes = [
+            (intent.device, intent.action == "on", intent.params or None)
+            for intent in get_grammar().parse(text)
+        ]
+        # several intents in one utterance go out as one cache write and one broadcast
+        await apply_changes(self.home, changes, "voice", self.channel_layer)
+    
+    async def send_device_states(self, since=None):
+        """Send the missed deltas since a version, or a full snapshot if they are gone"""
+        # joined the group before reading, so nothing falls in between; the client
+        # ignores broadcasts with a version it has already seen, which is safe because
+        # the states read are at least as new as the version (store_changes writes them first)
+        deltas = await sync_to_async(get_deltas)(self.home, since) if since is not None else None
+        if deltas is not None:
+            version, states = deltas
+            await self.send(json.dumps({"type": "device_delta", "home": self.home, "since": since,
+                                        "version": version, "states": states}))
+            return
+        version, states = await sync_to_async(get_snapshot)(self.home)
+        await self.send(json.dumps({"type": "device_snapshot", "home": self.home, "version": version, "states": states}))
+    
+    async def home_changed(self, event):
+        """The user joined or left a home: move the socket to it without a reconnect"""
+        home = await sync_to_async(get_home_id)(self.user_id)
+        if home == self.home:
+            return
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        self.home, self.group_name = home, device_group(home)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        self.outbox.frames.clear()
+        await self.send_device_states()
+    
+    async def device_frame(self, event):
+        """Receive device update broadcasts, the frame is shared by every socket of the home"""
+        self.outbox.put(event["text"])
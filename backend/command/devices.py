@@ -0,0 +1,94 @@
+from typing import Dict, Iterable, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import caches
+
+from .broadcast import get_coalescer
+
+# Devices come from settings.VOICE_DEVICES, every home has its own state for each of them
+DEVICES = tuple(settings.VOICE_DEVICES)
+
+# Per home: the broadcast group its sockets join and the cache keys of its device states.
+# Every applied batch gets the home's next version, its changes are kept for a while
+# under the delta key so reconnecting clients can catch up. States and versions are in
+# the "devices" cache, which never evicts, deltas in the bounded "device_deltas" one
+DEVICE_GROUP = "home_{}_devices"
+DEVICE_KEY = "home_{}_device_{}"
+VERSION_KEY = "home_{}_version"
+DELTA_KEY = "home_{}_delta_{}"
+
+
+def device_group(home: str) -> str:
+    return DEVICE_GROUP.format(home)
+
+
+def device_keys(home: str) -> Dict[str, str]:
+    return {name: DEVICE_KEY.format(home, name) for name in DEVICES}
+
+# (device, state, source_meta)
+Change = Tuple[str, bool, Optional[dict]]
+
+
+def merge_changes(changes: Iterable[Change]) -> Dict[str, Change]:
+    # last change to a device wins, so one utterance or request writes each device once
+    merged: Dict[str, Change] = {}
+    for change in changes:
+        merged[change[0]] = change
+    return merged
+
+
+def store_changes(home: str, changes: Iterable[Change]) -> int:
+    """Write a batch of a home's device states, returns the version it was stored as"""
+    cache = caches["devices"]
+    states = {device: state for device, state, _ in changes}
+    # states before the version: whoever reads version N also reads the states of N.
+    # The delta of N lands just after, get_deltas falls back to a snapshot meanwhile
+    cache.set_many({DEVICE_KEY.format(home, device): state for device, state in states.items()}, timeout=None)
+    # add() is a no-op once the counter exists, incr() is atomic
+    version_key = VERSION_KEY.format(home)
+    cache.add(version_key, 0, timeout=None)
+    version = cache.incr(version_key)
+    caches["device_deltas"].set(DELTA_KEY.format(home, version), states, timeout=settings.DEVICE_DELTA_TTL)
+    return version
+
+
+async def apply_changes(home: str, changes: Iterable[Change], source: str, channel_layer=None):
+    """Store a batch of device states with one bulk cache write and broadcast it to the home"""
+    # states are stored right away, the broadcast may be merged with the next few batches
+    merged = merge_changes(changes)
+    if not merged:
+        return
+    version = await sync_to_async(store_changes)(home, merged.values())
+    updates = [(device, state, meta, source) for device, state, meta in merged.values()]
+    await get_coalescer().publish(device_group(home), updates, version, channel_layer or get_channel_layer())
+
+
+def get_snapshot(home: str) -> Tuple[int, Dict[str, bool]]:
+    """(version, state of every device in the home) read with a single get_many"""
+    keys = device_keys(home)
+    version_key = VERSION_KEY.format(home)
+    # the version is read first (and with the states at once on Redis), so the states
+    # are at least as new as it, a newer broadcast the client applies on top is harmless
+    found = caches["devices"].get_many([version_key, *keys.values()])
+    states = {device: found.get(key, False) for device, key in keys.items()}
+    return found.get(version_key, 0), states
+
+
+def get_deltas(home: str, since: int) -> Optional[Tuple[int, Dict[str, bool]]]:
+    """
+    (version, states changed after `since`) for a reconnecting client,
+    None if that history is gone and the client needs a full snapshot
+    """
+    version = caches["devices"].get(VERSION_KEY.format(home), 0)
+    if since > version or version - since > settings.DEVICE_DELTA_MAX:
+        return None
+    keys = [DELTA_KEY.format(home, v) for v in range(since + 1, version + 1)]
+    found = caches["device_deltas"].get_many(keys)
+    if len(found) != len(keys):
+        return None
+    states: Dict[str, bool] = {}
+    for key in keys:
+        states.update(found[key])
+    return version, states
@@ -0,0 +1,105 @@
+from collections import Counter, defaultdict
+from functools import lru_cache
+from itertools import chain
+from typing import Dict, Generic, List, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# letters that sound alike share a class, vowels after the first letter are dropped
+_SOUND_CLASSES = {
+    "b": "p", "p": "p",
+    "d": "t", "t": "t",
+    "c": "k", "g": "k", "k": "k", "q": "k", "x": "k",
+    "m": "n", "n": "n",
+    "s": "s", "z": "s",
+    "f": "f", "v": "f",
+    "j": "j", "l": "l", "r": "r",
+}
+
+
+@lru_cache(maxsize=4096)
+def phonetic(word: str) -> str:
+    # Cheap phonetic key: "land" -> "lnt", "lamb" -> "lnp", "of" -> "of"
+    word = word.replace("ph", "f").replace("ck", "k").replace("th", "t")
+    key = word[:1]
+    last = _SOUND_CLASSES.get(key, key)
+    for ch in word[1:]:
+        cls = _SOUND_CLASSES.get(ch)
+        if cls and cls != last:
+            key += cls
+        last = cls
+    return key
+
+
+def _trigrams(text: str) -> List[str]:
+    padded = f"  {text} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def similarity(a: str, b: str) -> float:
+    # 1 - normalized Levenshtein distance
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return 1.0 - prev[-1] / max(len(a), len(b))
+
+
+class PhoneticIndex(Generic[T]):
+    """
+    Fuzzy lookup of near-miss words ("lamb" -> "lamp", "of" -> "off").
+    Words are indexed once by phonetic key and by trigrams of the spelling, so a
+    lookup only scores the few words sharing the most trigrams with the input
+    instead of the whole vocabulary. Scores are weighted towards the phonetic
+    key, spelling breaks ties. Results are cached per input word.
+    """
+
+    def __init__(self, floor: float = 0.5, candidates: int = 8, cache_size: int = 10000):
+        self.floor = floor
+        self.candidates = candidates
+        self.cache_size = cache_size
+        self.words: List[Tuple[str, str, T]] = [] # (word, key, payload)
+        self.by_key: Dict[str, List[int]] = defaultdict(list)
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        self._cache: Dict[str, List[Tuple[T, float]]] = {}
+
+    def add(self, word: str, payload: T):
+        idx = len(self.words)
+        key = phonetic(word)
+        self.words.append((word, key, payload))
+        self.by_key[key].append(idx)
+        for gram in set(_trigrams(word)):
+            self.postings[gram].append(idx)
+        self._cache.clear()
+
+    def score(self, word: str, idx: int) -> float:
+        other, key, _ = self.words[idx]
+        return (2 * similarity(phonetic(word), key) + similarity(word, other)) / 3
+
+    def matches(self, word: str) -> List[Tuple[T, float]]:
+        # (payload, score) of indexed words scoring at least `floor`, best first
+        found = self._cache.get(word)
+        if found is None:
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            found = self._cache[word] = self._matches(word)
+        return found
+
+    def _matches(self, word: str) -> List[Tuple[T, float]]:
+        counts = Counter(chain.from_iterable(self.postings.get(gram, ()) for gram in set(_trigrams(word))))
+        shortlist = {idx for idx, _ in counts.most_common(self.candidates)}
+        shortlist.update(self.by_key.get(phonetic(word), ()))
+
+        scored = []
+        for idx in shortlist:
+            score = self.score(word, idx)
+            if score >= self.floor:
+                scored.append((self.words[idx][2], round(score, 3)))
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored
@@ -0,0 +1,263 @@
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+
+from .fuzzy import PhoneticIndex
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# symbol kinds produced by the phrase index
+DEVICE = "device"
+ACTION = "action"
+JOIN = "join"
+
+
+class Intent(NamedTuple):
+    device: str
+    action: str
+    params: dict
+
+
+class CommandGrammar:
+    """
+    Voice command grammar compiled once into a token trie.
+    parse() makes a single longest-match pass over the transcript and returns
+    intents in the order they were spoken, e.g. "lamp on and fan off" ->
+    [(lamp, on), (fan, off)]. Words outside the vocabulary are ignored.
+
+    With a fuzzy_threshold, words the trie doesn't know are matched against a
+    phonetic index of the vocabulary words and walked through the same trie.
+    A near miss is accepted when its score reaches the threshold, or when it is
+    within boost_margin of it and sits next to an exact word of the other kind
+    ("land on": a weak device next to an exact action) and the average does.
+    A vocabulary word that doesn't complete a phrase ("switch" in "switch main
+    on") is never read as another word, and an exact action takes the devices before it over from
+    a fuzzy one. Those intents carry the score and what was heard in params.
+    """
+
+    def __init__(self, devices: Dict[str, Iterable[str]], actions: Dict[str, Iterable[str]],
+                 joiners: Iterable[str] = (), all_devices: Iterable[str] = (),
+                 fuzzy_threshold: Optional[float] = None, boost_margin: float = 0.15,
+                 cache_size: int = 4096):
+        self.devices = list(devices)
+        self.cache_size = cache_size
+        self._parsed: Dict[str, List[Intent]] = {}
+        self.trie: dict = {}
+        for device, phrases in devices.items():
+            for phrase in (device, *phrases):
+                self._add(phrase, (DEVICE, (device,)))
+        # "all", "everything" stand for every device
+        for phrase in all_devices:
+            self._add(phrase, (DEVICE, tuple(self.devices)))
+        for action, phrases in actions.items():
+            for phrase in phrases:
+                self._add(phrase, (ACTION, action))
+        self.vocabulary = set(self.words)
+        for phrase in joiners:
+            self._add(phrase, (JOIN, None))
+
+        self.fuzzy_threshold = fuzzy_threshold
+        self.boost_margin = boost_margin
+        self.fuzzy = None
+        if fuzzy_threshold:
+            self.fuzzy = PhoneticIndex()
+            for word in sorted(self.vocabulary):
+                self.fuzzy.add(word, word)
+
+    @property
+    def words(self):
+        # every token that appears in a device or action phrase
+        stack = [self.trie]
+        while stack:
+            node = stack.pop()
+            for token, child in node.items():
+                if token != "$":
+                    yield token
+                    stack.append(child)
+
+    def _add(self, phrase: str, symbol: Tuple[str, object]):
+        node = self.trie
+        for token in TOKEN_RE.findall(phrase.lower()):
+            node = node.setdefault(token, {})
+        node["$"] = symbol
+
+    def symbols(self, text: str) -> List[Tuple[str, object, Optional[dict]]]:
+        # Longest match of the phrase index at each position as (kind, value, fuzzy match).
+        # Unknown tokens go to the fuzzy index if enabled, otherwise they are skipped
+        tokens = TOKEN_RE.findall(text.lower())
+        spans = []  # (start, end, symbol, fuzzy match)
+        unknown = []
+        i = 0
+        while i < len(tokens):
+            node = self.trie
+            match = None
+            j = i
+            while j < len(tokens) and tokens[j] in node:
+                node = node[tokens[j]]
+                j += 1
+                if "$" in node:
+                    match = (node["$"], j)
+            if match:
+                spans.append((i, match[1], match[0], None))
+                i = match[1]
+            else:
+                unknown.append(i)
+                i += 1
+
+        if self.fuzzy and unknown:
+            fuzzy = self._fuzzy_spans(tokens, unknown, spans)
+            if fuzzy:
+                spans.extend(fuzzy)
+                spans.sort(key=lambda span: span[0])
+        return [(symbol[0], symbol[1], match) for _, _, symbol, match in spans]
+
+    def _fuzzy_spans(self, tokens: List[str], unknown: List[int], spans):
+        exact_at = {start: symbol for start, _, symbol, _ in spans}
+        exact_to = {end: symbol for _, end, symbol, _ in spans}
+        found = []
+        # runs of consecutive unknown tokens, a fuzzy phrase never crosses an exact one
+        runs = []
+        for i in unknown:
+            if runs and runs[-1][1] == i:
+                runs[-1][1] = i + 1
+            else:
+                runs.append([i, i + 1])
+
+        for start, stop in runs:
+            i = start
+            while i < stop:
+                best = self._fuzzy_walk(tokens, i, stop)
+                if best is None:
+                    i += 1
+                    continue
+                symbol, score, end = best
+                if self.fuzzy_threshold - self.boost_margin <= score < self.fuzzy_threshold:
+                    # a near match counts if an exact word of the other kind is right next to it
+                    neighbours = [exact_to.get(i) if i == start else None, exact_at.get(end) if end == stop else None]
+                    if any(n and n[0] != symbol[0] and JOIN not in (n[0], symbol[0]) for n in neighbours):
+                        score = (score + 1) / 2
+                if score >= self.fuzzy_threshold:
+                    found.append((i, end, symbol, {"heard": " ".join(tokens[i:end]), "score": round(score, 3), "at": i}))
+                    i = end
+                else:
+                    i += 1
+        return found
+
+    def _fuzzy_walk(self, tokens: List[str], i: int, stop: int):
+        # best (symbol, mean word score, end) of a trie phrase starting at tokens[i], longer wins ties
+        best = None
+        frontier = [(self.trie, i, 0.0)]
+        while frontier:
+            node, j, total = frontier.pop()
+            if j > i and "$" in node and node["$"][0] != JOIN:
+                score = total / (j - i)
+                if best is None or (score, j) > (best[1], best[2]):
+                    best = (node["$"], score, j)
+            if j < stop:
+                # a vocabulary word is only ever itself ("switch" in "switch main on" is not "stop")
+                near = [(tokens[j], 1.0)] if tokens[j] in self.vocabulary else self.fuzzy.matches(tokens[j])
+                for word, score in near:
+                    if word in node:
+                        frontier.append((node[word], j + 1, total + score))
+        return best
+
+    def parse(self, text: str) -> List[Intent]:
+        # the same few commands make up most traffic, so parsed transcripts are cached
+        key = text.lower()
+        if not self.cache_size:
+            return self._parse(key)
+        intents = self._parsed.get(key)
+        if intents is None:
+            if len(self._parsed) >= self.cache_size:
+                self._parsed.clear()
+            intents = self._parsed[key] = self._parse(key)
+        return list(intents)
+
+    def _parse(self, text: str) -> List[Intent]:
+        intents: List[Intent] = []
+        # devices named but not yet given an action as (position, device), split at "and"/"then"
+        groups: List[List[Tuple[int, str]]] = [[]]
+        # action said before its devices ("turn on the lamp and the fan")
+        open_action = None
+
+        # fuzzy matches behind devices and the open action, reported in the intent params
+        matches: Dict[str, dict] = {}
+        open_match = None
+
+        def emit(group, action, action_match):
+            for _, device in group:
+                device_match = matches.get(device)
+                params = {}
+                if device_match or action_match:
+                    found = sorted((m for m in (device_match, action_match) if m), key=lambda m: m["at"])
+                    params = {"score": min(m["score"] for m in found),
+                              "heard": " ".join(m["heard"] for m in found)}
+                intents.append(Intent(device, action, params))
+
+        for at, (kind, value, match) in enumerate(self.symbols(text)):
+            if kind == DEVICE:
+                group = groups[-1]
+                for device in value:
+                    # a device named again counts where it was last named ("everything, fan off")
+                    group[:] = [named for named in group if named[1] != device]
+                    group.append((at, device))
+                    if match:
+                        matches[device] = match
+                    elif matches:
+                        matches.pop(device, None)
+            elif kind == JOIN:
+                if groups[-1]:
+                    groups.append([])
+            else:
+                named = [group for group in groups if group]
+                if open_action is None:
+                    # "lamp and fan off": everything named so far takes this action
+                    for group in named:
+                        emit(group, value, match)
+                    open_action, open_match = (None, None) if named else (value, match)
+                elif not groups[-1]:
+                    # "turn on the fan and off the ac": an action after "and" (or right after
+                    # the open one) names its own devices, the open action keeps the rest
+                    for group in named:
+                        emit(group, open_action, open_match)
+                    open_action, open_match = value, match
+                else:
+                    # "turn on lamp and fan off", "turn on lamp fan off": the devices right before
+                    # the new action are its own, the last group or else the last device named,
+                    # as long as the open action keeps one. An exact action takes a lone group
+                    # from an open one that was only a fuzzy match
+                    last = named.pop()
+                    if not named and (open_match is None or match is not None):
+                        at = last[-1][0]
+                        kept = [device for device in last if device[0] != at]
+                        named = [kept or last]
+                        last = [device for device in last if device[0] == at] if kept else []
+                    for group in named:
+                        emit(group, open_action, open_match)
+                    if last:
+                        emit(last, value, match)
+                    open_action, open_match = (None, None) if last else (value, match)
+                groups = [[]]
+
+        if open_action is not None:
+            for group in groups:
+                emit(group, open_action, open_match)
+        return intents
+
+
+_grammar: Optional[CommandGrammar] = None
+
+
+def get_grammar() -> CommandGrammar:
+    # Built from settings on first use and shared by every consumer in the process
+    global _grammar
+    if _grammar is None:
+        _grammar = CommandGrammar(
+            devices=settings.VOICE_DEVICES,
+            actions=settings.VOICE_ACTIONS,
+            joiners=settings.VOICE_JOINERS,
+            all_devices=settings.VOICE_ALL_DEVICES,
+            fuzzy_threshold=settings.VOICE_FUZZY_THRESHOLD,
+        )
+    return _grammar
@@ -0,0 +1,129 @@
+from typing import Dict, Iterable, List, Optional
+
+from asgiref.sync import async_to_sync
+from bson import ObjectId
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from pymongo import ReturnDocument
+
+from config.config import MongoClientSingleton
+
+# Device state and broadcasts are scoped per home. Every user has a personal home whose
+# id is their own user_id; sharing it creates a document in the homes collection
+#   {"_id": <owner user_id>, "owner": <owner user_id>, "members": [<user_id>, ...],
+#    "invited": [<user_id>, ...]}
+# The owner invites, a user only becomes a member (and uses the owner's home instead of
+# their own) once they accept. The owner is in members only while somebody else is.
+# The speech sockets of a user also join their member group, told when the home changes
+HOME_KEY = "home_of_{}"
+MEMBER_GROUP = "member_{}"
+HOME_CHANGED = {"type": "home.changed"}
+
+
+def member_group(user_id: str) -> str:
+    return MEMBER_GROUP.format(user_id)
+
+
+def homes_collection():
+    return MongoClientSingleton.get_db()["homes"]
+
+
+def find_user_id(username: str) -> Optional[str]:
+    user = MongoClientSingleton.get_db()["users"].find_one({"username": username}, {"_id": 1})
+    return str(user["_id"]) if user else None
+
+
+def get_home_id(user_id: str) -> str:
+    """Home a user controls, cached since it's needed on every request and socket"""
+    key = HOME_KEY.format(user_id)
+    home_id = cache.get(key)
+    if home_id is None:
+        home = homes_collection().find_one({"members": user_id}, {"_id": 1})
+        home_id = home["_id"] if home else user_id
+        cache.set(key, home_id, timeout=settings.HOME_CACHE_TTL)
+    return home_id
+
+
+def get_home(user_id: str) -> dict:
+    home_id = get_home_id(user_id)
+    home = homes_collection().find_one({"_id": home_id})
+    if home is None:
+        return {"id": home_id, "owner": user_id, "members": [user_id], "invited": []}
+    return _home(home)
+
+
+def _home(home: dict) -> dict:
+    return {"id": home["_id"], "owner": home["owner"], "members": home.get("members") or [home["owner"]],
+            "invited": home.get("invited", [])}
+
+
+def invite_member(owner_id: str, user_id: str) -> dict:
+    """Invite a user to the owner's home, nothing changes for them until they accept"""
+    home = homes_collection().find_one({"_id": owner_id, "members": user_id})
+    if home is None:
+        home = homes_collection().find_one_and_update(
+            {"_id": owner_id},
+            {"$setOnInsert": {"owner": owner_id}, "$addToSet": {"invited": user_id}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    return _home(home)
+
+
+def get_invites(user_id: str) -> List[dict]:
+    """Homes the user was invited to and hasn't answered, with the owner's username"""
+    homes = list(homes_collection().find({"invited": user_id}, {"owner": 1}))
+    names = usernames(home["owner"] for home in homes)
+    return [{"home": home["_id"], "owner": names.get(home["owner"])} for home in homes]
+
+
+def accept_invite(home_id: str, user_id: str) -> Optional[dict]:
+    """Join a home the user was invited to, None if there's no such invitation"""
+    home = homes_collection().find_one_and_update(
+        {"_id": home_id, "invited": user_id},
+        {"$pull": {"invited": user_id}, "$addToSet": {"members": {"$each": [home_id, user_id]}}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if home is None:
+        return None
+    # a personal home left with only the user in it (from before owners were pulled)
+    homes_collection().update_many({"_id": {"$ne": home_id}, "members": [user_id]}, {"$pull": {"members": user_id}})
+    forget(home["members"])
+    return _home(home)
+
+
+def decline_invite(home_id: str, user_id: str):
+    homes_collection().update_one({"_id": home_id}, {"$pull": {"invited": user_id}})
+
+
+def member_elsewhere(user_id: str, home_id: str) -> bool:
+    # already shares another home: someone else's, or their own with members in it
+    return homes_collection().find_one({"members": user_id, "_id": {"$ne": home_id}, "members.1": {"$exists": True}},
+                                       {"_id": 1}) is not None
+
+
+def remove_member(home_id: str, user_id: str):
+    # the user falls back to their personal home (or loses the invitation),
+    # the owner can't leave their own
+    if user_id == home_id:
+        return
+    homes_collection().update_one({"_id": home_id}, {"$pull": {"members": user_id, "invited": user_id}})
+    # the last member gone, the owner is back to a personal home
+    homes_collection().update_one({"_id": home_id, "members": [home_id]}, {"$pull": {"members": home_id}})
+    forget([user_id])
+
+
+def usernames(user_ids: Iterable[str]) -> Dict[str, str]:
+    ids = [ObjectId(user_id) for user_id in set(user_ids) if ObjectId.is_valid(user_id)]
+    users = MongoClientSingleton.get_db()["users"].find({"_id": {"$in": ids}}, {"username": 1})
+    return {str(user["_id"]): user["username"] for user in users}
+
+
+def forget(user_ids: Iterable[str]):
+    # drop the cached home, then tell the users' open sockets to look it up again
+    user_ids = list(user_ids)
+    cache.delete_many([HOME_KEY.format(user_id) for user_id in user_ids])
+    group_send = async_to_sync(get_channel_layer().group_send)
+    for user_id in user_ids:
+        group_send(member_group(user_id), HOME_CHANGED)
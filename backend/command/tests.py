@@ -1,3 +1,110 @@
-from django.test import TestCase
+from datetime import datetime
+from unittest import skipUnless
 
-# Create your tests here.
+from channels_redis.core import RedisChannelLayer
+from channels_redis.pubsub import RedisPubSubChannelLayer
+from django.conf import settings
+from django.core.cache import caches
+from django.test import SimpleTestCase
+
+from benchmarks.broadcast_latency import measure, redis_available
+
+from user.consumers import profile_update_event
+
+from .broadcast import build_event
+from .devices import get_deltas, get_snapshot, store_changes
+from .grammar import CommandGrammar
+from .homes import HOME_CHANGED
+
+
+class GrammarTests(SimpleTestCase):
+    def setUp(self):
+        self.grammar = CommandGrammar(settings.VOICE_DEVICES, settings.VOICE_ACTIONS, settings.VOICE_JOINERS,
+                                      settings.VOICE_ALL_DEVICES)
+
+    def parse(self, text):
+        return [(intent.device, intent.action) for intent in self.grammar.parse(text)]
+
+    def test_action_after_the_next_device(self):
+        self.assertEqual(self.parse("turn on lamp fan off"), [("lamp", "on"), ("fan", "off")])
+        self.assertEqual(self.parse("turn off lamp fan on"), [("lamp", "off"), ("fan", "on")])
+        self.assertEqual(self.parse("turn on lamp and fan off"), [("lamp", "on"), ("fan", "off")])
+        self.assertEqual(self.parse("turn on everything fan off"),
+                         [("main", "on"), ("lamp", "on"), ("ac", "on"), ("fan", "off")])
+
+    def test_action_after_a_joiner(self):
+        self.assertEqual(self.parse("turn on the fan and the light and off the ac"),
+                         [("fan", "on"), ("lamp", "on"), ("ac", "off")])
+        self.assertEqual(self.parse("turn on lamp turn off fan"), [("lamp", "on"), ("fan", "off")])
+        self.assertEqual(self.parse("turn on the lamp and the fan"), [("lamp", "on"), ("fan", "on")])
+
+
+class FuzzyGrammarTests(SimpleTestCase):
+    def setUp(self):
+        self.grammar = CommandGrammar(settings.VOICE_DEVICES, settings.VOICE_ACTIONS, settings.VOICE_JOINERS,
+                                      settings.VOICE_ALL_DEVICES, fuzzy_threshold=0.75)
+
+    def parse(self, text):
+        return [(intent.device, intent.action) for intent in self.grammar.parse(text)]
+
+    def test_exact_action_after_the_device_wins(self):
+        self.assertEqual(self.parse("switch main on"), [("main", "on")])
+        self.assertEqual(self.parse("switch lamp on"), [("lamp", "on")])
+        self.assertEqual(self.parse("switch fan on"), [("fan", "on")])
+        self.assertEqual(self.parse("set fan on"), [("fan", "on")])
+        self.assertEqual(self.parse("stopp main on"), [("main", "on")])
+
+    def test_near_misses(self):
+        self.assertEqual(self.parse("land on"), [("lamp", "on")])
+        self.assertEqual(self.parse("fan of"), [("fan", "off")])
+        self.assertEqual(self.parse("turn of the lamb"), [("lamp", "off")])
+        self.assertEqual(self.parse("stopp main and fan on"), [("main", "off"), ("fan", "on")])
+        self.assertEqual(self.grammar.parse("lamb on")[0].params, {"score": 0.917, "heard": "lamb"})
+
+    def test_exact_phrases(self):
+        self.assertEqual(self.parse("turn on lamp and fan off"), [("lamp", "on"), ("fan", "off")])
+        self.assertEqual(self.parse("switch on the fan"), [("fan", "on")])
+
+
+class DeviceStateTests(SimpleTestCase):
+    def setUp(self):
+        for alias in ("default", "devices", "device_deltas"):
+            caches[alias].clear()
+
+    def test_busy_home_does_not_evict_other_homes(self):
+        store_changes("quiet", [("lamp", True, None)])
+        for i in range(400):
+            store_changes("busy", [("fan", i % 2 == 0, None)])
+        self.assertEqual(get_snapshot("quiet"), (1, {"main": False, "lamp": True, "fan": False, "ac": False}))
+        self.assertEqual(get_snapshot("busy")[0], 400)
+        self.assertEqual(get_deltas("busy", 398), (400, {"fan": False}))
+
+
+class ChannelLayerEventTests(SimpleTestCase):
+    # every group_send event must survive the Redis layers' msgpack serializer (no connection needed)
+    def events(self):
+        return [
+            build_event([("lamp", True, {"via": "voice"}, "voice")], 0, 1),
+            build_event([("lamp", True, None, "api"), ("fan", False, None, "api")], 1, 3),
+            profile_update_event({"_id": "65f0", "username": "user", "created_at": datetime(2026, 1, 1),
+                                  "accessibilitySettings": {"ttsEnabled": False}}),
+            HOME_CHANGED,
+        ]
+
+    def test_events_serialize_on_redis_layers(self):
+        for layer in (RedisChannelLayer(hosts=["redis://localhost:1"]),
+                      RedisPubSubChannelLayer(hosts=["redis://localhost:1"])):
+            for event in self.events():
+                with self.subTest(layer=type(layer).__name__, type=event["type"]):
+                    self.assertEqual(layer.deserialize(layer.serialize(event))["type"], event["type"])
+
+
+@skipUnless(redis_available(), "needs REDIS_URL or redis-server on PATH")
+class CrossWorkerBroadcastTests(SimpleTestCase):
+    # two worker processes on one Redis: changes applied on one reach every socket of the other
+    def test_every_change_reaches_every_socket(self):
+        for pubsub in (False, True):
+            with self.subTest(pubsub=pubsub):
+                latencies = measure(sockets=10, changes=50, interval=0.005, pubsub=pubsub)
+                self.assertEqual(len(latencies), 10 * 50)
+                self.assertLess(latencies[int(0.99 * len(latencies))], 0.25)
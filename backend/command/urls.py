@@ -1,7 +1,12 @@
 from django.urls import path
-from .views import control_device, get_device_state
+from .views import control_device, control_devices, activate_scene, get_device_state, home_details, home_invites, home_members
 
 urlpatterns = [
+    path("home/", home_details, name="home_details"),
+    path("home/members/", home_members, name="home_members"),
+    path("home/invites/", home_invites, name="home_invites"),
+    path("batch/", control_devices, name="control_devices"),
+    path("scenes/<str:scene_name>/", activate_scene, name="activate_scene"),
     path("<str:device_name>/control/", control_device, name="control_device"),
     path("<str:device_name>/state/", get_device_state, name="get_device_state"),
 ]
\ No newline at end of file
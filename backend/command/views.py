@@ -1,25 +1,20 @@
 import json
-from django.core.cache import cache
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
 from django.http import JsonResponse
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_POST, require_http_methods
 from decorators.auth_decorator import jwt_login_required
-
-# Device states stored in cache
-DEVICE_KEYS = {
-    'main': 'device_main',
-    'lamp': 'device_lamp', 
-    'fan': 'device_fan',
-    'ac': 'device_ac'
-}
+from .devices import DEVICES, DEVICE_KEY, apply_changes
+from .homes import (accept_invite, decline_invite, find_user_id, get_home, get_home_id, get_invites, invite_member,
+                    member_elsewhere, remove_member)
 
 @csrf_exempt
 @require_POST
 @jwt_login_required  # JWT authentication middleware
-def control_device(request, device_name):
-    if device_name not in DEVICE_KEYS:
+async def control_device(request, device_name):
+    if device_name not in DEVICES:
         return JsonResponse({'error': 'Device not found'}, status=404)
     
     try:
@@ -29,31 +24,123 @@ def control_device(request, device_name):
         if state not in [True, False]:
             return JsonResponse({'error': 'Invalid state'}, status=400)
         
-        # Store device state
-        cache.set(DEVICE_KEYS[device_name], state, timeout=None)
-        
-        # Broadcast state change to all WebSocket clients
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            "device_updates",
-            {
-                "type": "device.update",
-                "device": device_name,
-                "state": state,
-                "source": "http"
-            }
-        )
+        # Store device state and broadcast it to the WebSocket clients of the user's home,
+        # async so waiting out the broadcast coalescing window doesn't hold a thread
+        home = await sync_to_async(get_home_id)(request.user_id)
+        await apply_changes(home, [(device_name, state, None)], "http")
         
         return JsonResponse({'success': True, 'device': device_name, 'state': state})
     
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON'}, status=400)
 
+@csrf_exempt
+@require_POST
+@jwt_login_required  # JWT authentication middleware
+async def control_devices(request):
+    # Switch many devices at once: {"states": {"lamp": true, "fan": false}}
+    try:
+        data = json.loads(request.body)
+        states = data.get('states')
+        
+        if not isinstance(states, dict) or not states:
+            return JsonResponse({'error': 'states must be a non-empty object'}, status=400)
+        
+        unknown = [name for name in states if name not in DEVICES]
+        if unknown:
+            return JsonResponse({'error': 'Device not found', 'devices': unknown}, status=404)
+        
+        if any(state not in [True, False] for state in states.values()):
+            return JsonResponse({'error': 'Invalid state'}, status=400)
+        
+        # One cache write and one broadcast for the whole batch
+        home = await sync_to_async(get_home_id)(request.user_id)
+        await apply_changes(home, [(name, state, None) for name, state in states.items()], "http")
+        
+        return JsonResponse({'success': True, 'states': states})
+    
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+@csrf_exempt
+@require_POST
+@jwt_login_required  # JWT authentication middleware
+async def activate_scene(request, scene_name):
+    scene = settings.DEVICE_SCENES.get(scene_name)
+    if scene is None:
+        return JsonResponse({'error': 'Scene not found'}, status=404)
+    
+    states = {name: state for name, state in scene.items() if name in DEVICES}
+    changes = [(name, state, {'scene': scene_name}) for name, state in states.items()]
+    await apply_changes(await sync_to_async(get_home_id)(request.user_id), changes, "scene")
+    
+    return JsonResponse({'success': True, 'scene': scene_name, 'states': states})
+
 @csrf_exempt
 @jwt_login_required  # JWT authentication middleware
 def get_device_state(request, device_name):
-    if device_name not in DEVICE_KEYS:
+    if device_name not in DEVICES:
         return JsonResponse({'error': 'Device not found'}, status=404)
     
-    state = cache.get(DEVICE_KEYS[device_name], False)
-    return JsonResponse({'device': device_name, 'state': state})
\ No newline at end of file
+    state = caches["devices"].get(DEVICE_KEY.format(get_home_id(request.user_id), device_name), False)
+    return JsonResponse({'device': device_name, 'state': state})
+
+@csrf_exempt
+@jwt_login_required  # JWT authentication middleware
+def home_details(request):
+    return JsonResponse({'home': get_home(request.user_id)})
+
+@csrf_exempt
+@require_http_methods(["POST", "DELETE"])
+@jwt_login_required  # JWT authentication middleware
+def home_members(request):
+    # POST {"username": ...} invites a user to the owner's home, DELETE removes a member
+    # or an invitation (or yourself)
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    
+    user_id = find_user_id(data.get('username', ''))
+    if user_id is None:
+        return JsonResponse({'error': 'User not found'}, status=404)
+    
+    home_id = get_home_id(request.user_id)
+    if request.method == "POST":
+        if home_id != request.user_id:
+            return JsonResponse({'error': 'Only the home owner can invite members'}, status=403)
+        if user_id == request.user_id:
+            return JsonResponse({'error': 'You are already a member'}, status=400)
+        # the user joins only once they accept (POST /api/device/home/invites/)
+        return JsonResponse({'home': invite_member(request.user_id, user_id)})
+    
+    if home_id != request.user_id and user_id != request.user_id:
+        return JsonResponse({'error': 'Only the home owner can remove members'}, status=403)
+    remove_member(home_id, user_id)
+    return JsonResponse({'home': get_home(request.user_id)})
+
+@csrf_exempt
+@require_http_methods(["GET", "POST", "DELETE"])
+@jwt_login_required  # JWT authentication middleware
+def home_invites(request):
+    # GET lists your invitations, POST {"home": ...} accepts one, DELETE {"home": ...} declines it
+    if request.method == "GET":
+        return JsonResponse({'invites': get_invites(request.user_id)})
+    
+    try:
+        home_id = json.loads(request.body).get('home')
+    except (json.JSONDecodeError, AttributeError):
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    if not isinstance(home_id, str):
+        return JsonResponse({'error': 'home is required'}, status=400)
+    
+    if request.method == "DELETE":
+        decline_invite(home_id, request.user_id)
+        return JsonResponse({'invites': get_invites(request.user_id)})
+    
+    if member_elsewhere(request.user_id, home_id):
+        return JsonResponse({'error': 'You already belong to another home'}, status=409)
+    home = accept_invite(home_id, request.user_id)
+    if home is None:
+        return JsonResponse({'error': 'Invitation not found'}, status=404)
+    return JsonResponse({'home': home})
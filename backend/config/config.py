@@ -1,6 +1,27 @@
+import asyncio
+import weakref
+
 import pymongo
 from django.conf import settings
 
+
+def mongo_options():
+    # shared by the sync and async clients
+    return dict(
+        username=settings.MONGO_USER,
+        password=settings.MONGO_PASS,
+        retryWrites=True,
+        w='majority',
+        maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+        minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=settings.MONGO_MAX_IDLE_TIME_MS,
+        waitQueueTimeoutMS=settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=settings.MONGO_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=settings.MONGO_SOCKET_TIMEOUT_MS,
+    )
+
+
 # Mongo Db connection using singleton principle
 # good for speed and reusable TCP connection avoding
 # muliple open connections
@@ -10,16 +31,28 @@ class MongoClientSingleton:
     @classmethod
     def get_mongo_client(cls):
         if cls._client is None:
-            cls._client = pymongo.MongoClient(
-                settings.MONGO_URI,
-                username=settings.MONGO_USER,
-                password=settings.MONGO_PASS,
-                retryWrites=True,
-                w='majority'
-            )
+            cls._client = pymongo.MongoClient(settings.MONGO_URI, **mongo_options())
             
         return cls._client
     
     @classmethod
     def get_db(cls):
-        return cls.get_mongo_client()[settings.MONGO_DB_NAME]
\ No newline at end of file
+        return cls.get_mongo_client()[settings.MONGO_DB_NAME]
+
+
+# Same for async views and consumers. An async client belongs to the event loop it
+# was created on, so there is one per loop (in practice the worker's only loop)
+class AsyncMongoClientSingleton:
+    _clients = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def get_mongo_client(cls):
+        loop = asyncio.get_running_loop()
+        client = cls._clients.get(loop)
+        if client is None:
+            client = cls._clients[loop] = pymongo.AsyncMongoClient(settings.MONGO_URI, **mongo_options())
+        return client
+
+    @classmethod
+    def get_db(cls):
+        return cls.get_mongo_client()[settings.MONGO_DB_NAME]
@@ -1,5 +1,18 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from django.conf import settings
+from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.tokens import AccessToken
 
+from main.metrics import register
+
+logger = logging.getLogger(__name__)
+
+
 def generate_jwt(user_id, username, email):
     token = AccessToken()
     token['user_id'] = user_id
@@ -7,9 +20,70 @@ def generate_jwt(user_id, username, email):
     token['email'] = email
     return str(token)
 
+
+class TokenVerifier:
+    """
+    Verified access token -> claims, so a token is only checked once while it's valid.
+    Bounded LRU, an entry is dropped at the token's exp. Rejected tokens aren't cached
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._claims: "OrderedDict[str, tuple]" = OrderedDict()  # token -> (claims, exp)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def verify(self, token: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._claims.get(token)
+            if entry is not None:
+                if entry[1] > now:
+                    self._claims.move_to_end(token)
+                    self.hits += 1
+                    return entry[0]
+                del self._claims[token]
+            self.misses += 1
+
+        try:
+            claims = dict(AccessToken(token).payload)
+        except TokenError as exc:
+            logger.debug("Rejected token: %s", exc)
+            return None
+
+        with self._lock:
+            self._claims[token] = (claims, claims.get("exp", now))
+            while len(self._claims) > self.max_size:
+                self._claims.popitem(last=False)
+        return claims
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "size": len(self._claims),
+            }
+
+
+_verifier: Optional[TokenVerifier] = None
+
+
+def get_verifier() -> TokenVerifier:
+    global _verifier
+    if _verifier is None:
+        _verifier = TokenVerifier(settings.TOKEN_CACHE_SIZE)
+    return _verifier
+
+
+@register("tokens")
+def token_stats() -> dict:
+    return get_verifier().stats()
+
+
 def decode_jwt(token):
-    try:
-        return AccessToken(token)
-    except Exception as e:
-        print(f"Failed to decode token: {str(e)}")
-        return None
\ No newline at end of file
+    # claims of a valid access token, None otherwise
+    return get_verifier().verify(token)
@@ -9,22 +9,19 @@ django.setup()
 
 # imports
 from django.core.asgi import get_asgi_application
-from channels.routing import ProtocolTypeRouter, URLRouter
-from main.jwt_middleware import JWTAuthMiddleware
-from command.routing import websocket_patterns as voice_ws
-from user.routing import websocket_urlpatterns as user_ws
+from channels.routing import ProtocolTypeRouter
+from main.startup import LazyApplication, WarmUp
 
 # Get the ASGI application
 django_asgi_app = get_asgi_application()
 
-websocket_routes = [
-    *voice_ws,
-    *user_ws,
-]
+# Consumers, Mongo pools and the index check load in the background after boot
+websocket_app = LazyApplication("main.routing.websocket_application")
 
-application = ProtocolTypeRouter({
-    "http": django_asgi_app,
-    "websocket": JWTAuthMiddleware(
-        URLRouter(websocket_routes)
-    ),
-})
+application = WarmUp(
+    ProtocolTypeRouter({
+        "http": django_asgi_app,
+        "websocket": websocket_app,
+    }),
+    lazy_apps=[websocket_app],
+)
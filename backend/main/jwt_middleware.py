@@ -15,13 +15,12 @@ class JWTAuthMiddleware(BaseMiddleware):
         query_params = parse_qs(query_string)
         token = query_params.get("token", [None])[0]
 
-        if token:
-            decoded = decode_jwt(token)
-            if decoded:
-                scope["user_id"] = decoded.get("user_id")
-                scope["user"] = decoded
-            else:
-                scope["user"] = AnonymousUser()
+        # Verified once here, consumers read the claims from the scope
+        decoded = decode_jwt(token) if token else None
+        scope["token_claims"] = decoded
+        if decoded:
+            scope["user_id"] = decoded.get("user_id")
+            scope["user"] = decoded
         else:
             scope["user"] = AnonymousUser()
 
@@ -0,0 +1,25 @@
+from typing import Callable, Dict
+
+from django.conf import settings
+from django.http import JsonResponse
+
+# name -> function returning that component's counters, registered by the modules that own them.
+# Counters are per worker process
+_providers: Dict[str, Callable[[], dict]] = {}
+
+
+def register(name: str):
+    def decorator(fn):
+        _providers[name] = fn
+        return fn
+    return decorator
+
+
+def collect() -> dict:
+    return {name: provider() for name, provider in _providers.items()}
+
+
+def metrics_view(request):
+    if not settings.METRICS_ENABLED:
+        return JsonResponse({'error': 'Not found'}, status=404)
+    return JsonResponse(collect())
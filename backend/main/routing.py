@@ -0,0 +1,14 @@
+from channels.routing import URLRouter
+from main.jwt_middleware import JWTAuthMiddleware
+from command.routing import websocket_patterns as voice_ws
+from user.routing import websocket_urlpatterns as user_ws
+
+websocket_routes = [
+    *voice_ws,
+    *user_ws,
+]
+
+# Loaded on the first websocket connection (or by the warm-up), see main/asgi.py
+websocket_application = JWTAuthMiddleware(
+    URLRouter(websocket_routes)
+)
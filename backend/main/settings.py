@@ -24,11 +24,14 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.getenv("SECRET_KEY")
-print(SECRET_KEY)
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+# Per-worker counters (caches, pools) served at /api/metrics/ without authentication,
+# off unless asked for: only enable it where the endpoint isn't reachable from outside
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "False") == "True"
+
 ALLOWED_HOSTS = ["127.0.0.1", "localhost"]
 CORS_ALLOWED_ORIGINS = ["http://127.0.0.1:5500", "http://localhost:3000"]
 
@@ -133,11 +136,239 @@ DATABASES = {
     }
 }
 
-CHANNEL_LAYERS = {
+# ---------- Auth Tokens ----------
+
+# Verified access tokens kept per worker (token -> claims until the token expires)
+TOKEN_CACHE_SIZE = 10000
+
+# ---------- Redis (Channel Layer & Cache) ----------
+
+# Comma separated redis:// URLs. Without them everything stays in process, which only
+# works with a single worker: broadcasts and device states don't reach other workers
+REDIS_URLS = [url.strip() for url in os.getenv("REDIS_URLS", "").split(",") if url.strip()]
+# Connections per pool (one pool per host and worker) and connect/command timeout in seconds
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "100"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "5"))
+# Send group broadcasts over Redis pub/sub instead of per-channel queues: one PUBLISH
+# per group_send and no polling, but messages to a socket that is reconnecting are lost
+# (clients catch up through the versioned device snapshot)
+CHANNEL_LAYER_PUBSUB = os.getenv("CHANNEL_LAYER_PUBSUB", "False") == "True"
+
+# no socket_timeout here, the channel layer blocks on reads for longer than that
+REDIS_HOSTS = [
+    {
+        "address": url,
+        "max_connections": REDIS_MAX_CONNECTIONS,
+        "socket_connect_timeout": REDIS_SOCKET_TIMEOUT,
+        "health_check_interval": 30,
+    }
+    for url in REDIS_URLS
+]
+
+if not REDIS_URLS:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
+elif CHANNEL_LAYER_PUBSUB:
+    # channels are sharded across the hosts by consistent hashing of their name
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.pubsub.RedisPubSubChannelLayer',
+            'CONFIG': {
+                'hosts': REDIS_HOSTS,
+                'prefix': 'hub',
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': REDIS_HOSTS,
+                'prefix': 'hub',
+                # seconds an undelivered message lives, a socket that far behind resyncs anyway
+                'expiry': 10,
+                'group_expiry': 86400,
+                # per channel queue length, speech sockets only receive device broadcasts
+                'capacity': 200,
+                'channel_capacity': {
+                    'http.request': 200,
+                    'websocket.send*': 100,
+                },
+            },
+        },
+    }
+
+# Read-through cache of user profiles (see user/profile_cache.py), TTL in seconds and
+# the number of entries kept per worker without Redis
+PROFILE_CACHE_TTL = 300
+PROFILE_CACHE_SIZE = 5000
+
+# Device states and their versions live in the cache, so workers must share it.
+# Multi-key reads (the device snapshot) need every key on one server, so the cache is not
+# sharded: it writes to the first URL and reads from the others when there are replicas
+CACHES = {
     'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'profiles': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'profiles',
+        'TIMEOUT': PROFILE_CACHE_TTL,
+        'OPTIONS': {'MAX_ENTRIES': PROFILE_CACHE_SIZE},
     },
 }
+if REDIS_URLS:
+    REDIS_CACHE = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv("REDIS_CACHE_URLS", ",".join(REDIS_URLS[:1])).split(","),
+        'KEY_PREFIX': 'hub',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'max_connections': REDIS_MAX_CONNECTIONS,
+            'socket_timeout': REDIS_SOCKET_TIMEOUT,
+            'socket_connect_timeout': REDIS_SOCKET_TIMEOUT,
+            'health_check_interval': 30,
+        },
+    }
+    # profiles are shared too, so an update invalidates them on every worker;
+    # their size is bounded by the Redis maxmemory policy instead of MAX_ENTRIES
+    CACHES = {
+        'default': REDIS_CACHE,
+        'profiles': {**REDIS_CACHE, 'KEY_PREFIX': 'hub_profiles', 'TIMEOUT': PROFILE_CACHE_TTL},
+    }
+
+# ---------- Devices & Voice Commands ----------
+
+# Devices the hub controls and the other words users call them by
+VOICE_DEVICES = {
+    "main": ["main power", "main switch", "power"],
+    "lamp": ["light", "lights", "lamp light"],
+    "fan": ["ceiling fan"],
+    "ac": ["a c", "air conditioner", "air conditioning", "aircon"],
+}
+# Named scenes applied in one batch by POST /api/device/scenes/<name>/
+DEVICE_SCENES = {
+    "all_on": {name: True for name in VOICE_DEVICES},
+    "all_off": {name: False for name in VOICE_DEVICES},
+    "night": {"main": True, "lamp": False, "fan": True, "ac": False},
+}
+# Seconds device changes are kept for reconnecting clients, and how many versions
+# a client may be behind before it gets a full snapshot instead of the deltas
+DEVICE_DELTA_TTL = 3600
+DEVICE_DELTA_MAX = 500
+# Device states and versions have their own cache that never evicts: a culled version
+# restarts at 1 and connected clients would drop every later broadcast as already seen.
+# Deltas go to a separate bounded one (locally), losing one only costs a client a snapshot.
+# On Redis both use the default connection, states and versions without a TTL so a
+# volatile-* maxmemory policy leaves them alone
+DEVICE_DELTA_CACHE_SIZE = int(os.getenv("DEVICE_DELTA_CACHE_SIZE", "10000"))
+if REDIS_URLS:
+    CACHES['devices'] = {**REDIS_CACHE, 'TIMEOUT': None}
+    CACHES['device_deltas'] = {**REDIS_CACHE, 'TIMEOUT': DEVICE_DELTA_TTL}
+else:
+    CACHES['devices'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'devices',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 2 ** 62},
+    }
+    CACHES['device_deltas'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'device_deltas',
+        'TIMEOUT': DEVICE_DELTA_TTL,
+        'OPTIONS': {'MAX_ENTRIES': DEVICE_DELTA_CACHE_SIZE},
+    }
+# Device updates to one home within this many ms go out as one broadcast (0 sends each batch)
+DEVICE_COALESCE_MS = int(os.getenv("DEVICE_COALESCE_MS", "30"))
+# Device frames a socket may have queued before a slow client is caught up another way:
+# "snapshot" replaces the queue with a fresh snapshot, "drop_oldest" drops frames and
+# leaves the client to resync on the version gap
+DEVICE_SEND_QUEUE_LIMIT = 32
+DEVICE_SEND_QUEUE_POLICY = "snapshot"
+# Seconds a user's home is cached, membership changes clear it right away
+HOME_CACHE_TTL = 300
+# Words that mean every device at once ("all off")
+VOICE_ALL_DEVICES = ["all", "everything", "all devices"]
+# Action phrases, longest match wins so "switch on" is read as one action
+VOICE_ACTIONS = {
+    "on": ["on", "turn on", "switch on", "power on", "activate", "enable", "start"],
+    "off": ["off", "turn off", "switch off", "power off", "shut off", "shut down", "deactivate", "disable", "stop"],
+}
+# Words separating commands in one utterance ("lamp on and fan off")
+VOICE_JOINERS = ["and", "then", "also", "plus"]
+# Minimum score (0-1) for near-miss transcripts ("land on", "fan of"), None disables fuzzy matching
+VOICE_FUZZY_THRESHOLD = 0.75
+
+# ---------- Speech Recognition ----------
+
+# Recognizer backend: "google", "vosk" (offline, needs a model directory), "stub"
+# (deterministic canned text for load tests) or a dotted path to a BaseRecognizer
+SPEECH_RECOGNIZER = {
+    "BACKEND": os.getenv("SPEECH_RECOGNIZER_BACKEND", "google"),
+    "OPTIONS": {
+        # only used by the vosk backend
+        "model_path": os.getenv("VOSK_MODEL_PATH", ""),
+    },
+}
+
+# Threads per worker process running blocking recognizer calls
+SPEECH_RECOGNITION_WORKERS = int(os.getenv("SPEECH_RECOGNITION_WORKERS", "4"))
+# Max recognitions running or waiting per worker process before new ones are rejected
+SPEECH_RECOGNITION_QUEUE_SIZE = int(os.getenv("SPEECH_RECOGNITION_QUEUE_SIZE", "32"))
+# Seconds to wait for one utterance before giving up on it
+SPEECH_RECOGNITION_TIMEOUT = float(os.getenv("SPEECH_RECOGNITION_TIMEOUT", "15"))
+
+# Longest utterance buffered per socket, longer speech is cut and recognized in pieces
+SPEECH_MAX_UTTERANCE_MS = int(os.getenv("SPEECH_MAX_UTTERANCE_MS", "10000"))
+
+# Audio kept from just before the VAD triggers, so the first consonant isn't clipped
+SPEECH_PREROLL_MS = int(os.getenv("SPEECH_PREROLL_MS", "240"))
+# Silence kept at the end of an utterance, the rest of the VAD hangover is not sent
+SPEECH_TRAILING_SILENCE_MS = int(os.getenv("SPEECH_TRAILING_SILENCE_MS", "100"))
+
+# Voice activity detection: "adaptive" compares each frame with the session's own noise
+# floor (learnt over the first SPEECH_VAD_CALIBRATION_MS, then tracked), "fixed" with
+# SPEECH_VAD_THRESHOLD RMS. Levels are RMS relative to full scale
+SPEECH_VAD_MODE = os.getenv("SPEECH_VAD_MODE", "adaptive")
+SPEECH_VAD_THRESHOLD = float(os.getenv("SPEECH_VAD_THRESHOLD", "0.01"))
+SPEECH_VAD_HANGOVER_MS = 600
+# speech starts at floor * START_RATIO and continues while above floor * STOP_RATIO
+SPEECH_VAD_START_RATIO = float(os.getenv("SPEECH_VAD_START_RATIO", "3.0"))
+SPEECH_VAD_STOP_RATIO = float(os.getenv("SPEECH_VAD_STOP_RATIO", "1.8"))
+# floor never assumed below this, so a digitally silent mic doesn't trigger on a click
+SPEECH_VAD_MIN_FLOOR = float(os.getenv("SPEECH_VAD_MIN_FLOOR", "0.002"))
+SPEECH_VAD_CALIBRATION_MS = int(os.getenv("SPEECH_VAD_CALIBRATION_MS", "200"))
+# frames crossing zero more often than this (per sample) can't start speech: breaths and hiss. 0 disables
+SPEECH_VAD_MAX_ZCR = float(os.getenv("SPEECH_VAD_MAX_ZCR", "0.35"))
+# Batch the VAD of every speech socket of a worker into one call per tick of this many ms
+# (voice/scheduler.py), worth it with hundreds of mics per worker. 0 runs it per message
+SPEECH_BATCH_TICK_MS = int(os.getenv("SPEECH_BATCH_TICK_MS", "0"))
+
+# Transcript cache (voice/transcript_cache.py): an utterance matching the acoustic fingerprint of
+# one the same user already said (same language) gets that transcript without recognition.
+# Only transcripts recognized with at least SPEECH_TRANSCRIPT_CACHE_MIN_CONFIDENCE are kept
+# (backends without a confidence never are). MIN_SIMILARITY is how alike (correlation, up to 1)
+# the fingerprints must be, 1 only takes exact replays. Entries are per worker, LRU evicted
+SPEECH_TRANSCRIPT_CACHE = os.getenv("SPEECH_TRANSCRIPT_CACHE", "False") == "True"
+SPEECH_TRANSCRIPT_CACHE_SIZE = int(os.getenv("SPEECH_TRANSCRIPT_CACHE_SIZE", "5000"))
+SPEECH_TRANSCRIPT_CACHE_PER_USER = int(os.getenv("SPEECH_TRANSCRIPT_CACHE_PER_USER", "50"))
+SPEECH_TRANSCRIPT_CACHE_MIN_SIMILARITY = float(os.getenv("SPEECH_TRANSCRIPT_CACHE_MIN_SIMILARITY", "0.97"))
+SPEECH_TRANSCRIPT_CACHE_MIN_CONFIDENCE = float(os.getenv("SPEECH_TRANSCRIPT_CACHE_MIN_CONFIDENCE", "0.85"))
+
+# Partial transcripts (streaming backends only): new audio per partial decode, 0 disables
+SPEECH_PARTIAL_INTERVAL_MS = int(os.getenv("SPEECH_PARTIAL_INTERVAL_MS", "400"))
+# Minimum wall-clock gap between two partial decodes of the same socket
+SPEECH_PARTIAL_MIN_GAP_MS = int(os.getenv("SPEECH_PARTIAL_MIN_GAP_MS", "300"))
+
+# Audio formats a speech socket may negotiate with ?audio=opus,mulaw,pcm16 (first supported
+# wins), frames then carry a header with a sequence number (voice/transport.py).
+# "opus" also needs opuslib and libopus. Clients that don't ask send bare 16 kHz PCM
+SPEECH_AUDIO_FORMATS = [name.strip() for name in os.getenv("SPEECH_AUDIO_FORMATS", "pcm16,mulaw,opus").split(",")
+                        if name.strip()]
 
 
 # Password validation
@@ -158,6 +389,19 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Hash cost is tunable, hashes made with other parameters are upgraded on the next login
+PASSWORD_HASHERS = [
+    'auth.hashers.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASH_ITERATIONS = int(os.getenv("PASSWORD_HASH_ITERATIONS", "1000000"))
+# Hashing runs on its own process pool, with at most this many hashes running or waiting
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", "64"))
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -185,4 +429,15 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MONGO_URI = os.getenv("MONGO_URI")
 MONGO_DB_NAME = os.getenv("MONGO_DB_NAME")
 MONGO_USER = os.getenv("MONGO_USER")
-MONGO_PASS = os.getenv("MONGO_PASS")
\ No newline at end of file
+MONGO_PASS = os.getenv("MONGO_PASS")
+# Connection pool per client (one sync and one async client per worker) and timeouts in ms
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = 60000
+# how long a request waits for a free pooled connection
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = 5000
+MONGO_SOCKET_TIMEOUT_MS = 10000
+# Create missing indexes in the background when a worker starts (also: manage.py ensure_indexes)
+MONGO_ENSURE_INDEXES = os.getenv("MONGO_ENSURE_INDEXES", "True") == "True"
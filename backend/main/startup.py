@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+class LazyApplication:
+    # ASGI app imported on its first connection, so booting a worker doesn't import
+    # every consumer (and what they pull in) before it can serve a request
+    def __init__(self, path: str):
+        self.path = path
+        self._app = None
+
+    def load(self):
+        if self._app is None:
+            self._app = import_string(self.path)
+        return self._app
+
+    async def __call__(self, scope, receive, send):
+        return await self.load()(scope, receive, send)
+
+
+def _warm_up_sync(lazy_apps):
+    # Blocking part: URL conf, consumers, the sync Mongo pool and the index check
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
+    for app in lazy_apps:
+        app.load()
+
+    from config.config import MongoClientSingleton
+    from user.indexes import ensure_indexes
+
+    try:
+        MongoClientSingleton.get_mongo_client().admin.command("ping")
+        # Unique username/email indexes back registration and profile updates
+        if settings.MONGO_ENSURE_INDEXES:
+            ensure_indexes()
+    except PyMongoError:
+        logger.exception("Mongo warm-up failed, run `python manage.py ensure_indexes` once it's reachable")
+
+
+async def _warm_up_async():
+    # The async client is per event loop, this has to run on the server's loop
+    from config.config import AsyncMongoClientSingleton
+
+    try:
+        await AsyncMongoClientSingleton.get_mongo_client().admin.command("ping")
+    except PyMongoError:
+        logger.warning("Async Mongo warm-up failed, connections open on first use")
+
+
+class WarmUp:
+    """
+    Wraps the ASGI application and warms its pools in the background: on lifespan
+    startup when the server sends it (uvicorn), otherwise on the first connection
+    (daphne has no lifespan). Requests are served meanwhile, whatever isn't warm
+    yet initializes on first use as usual.
+    """
+
+    def __init__(self, app, lazy_apps=()):
+        self.app = app
+        self.lazy_apps = lazy_apps
+        self.started = False
+        self._task = None
+
+    def start(self):
+        if self.started:
+            return
+        self.started = True
+        threading.Thread(target=self._run_sync, name="warm-up", daemon=True).start()
+        self._task = asyncio.ensure_future(_warm_up_async())
+
+    def _run_sync(self):
+        try:
+            _warm_up_sync(self.lazy_apps)
+        except Exception:
+            logger.exception("Warm-up failed")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        self.start()
+        return await self.app(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._task is not None:
+                    self._task.cancel()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
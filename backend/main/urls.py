@@ -2,13 +2,15 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings # MEDIA_URL/ROOT
 from django.conf.urls.static import static # static for media files in dev
+from .metrics import metrics_view
 
 # Handles http request/response path
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('auth.urls')),
     path('api/device/', include('command.urls')),
-    path('api/user/', include('user.urls'))
+    path('api/user/', include('user.urls')),
+    path('api/metrics/', metrics_view, name='metrics'),
 ]
 
 # Serve media files during development (ONLY if DEBUG is True)
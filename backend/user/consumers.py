@@ -2,8 +2,7 @@ import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from datetime import datetime
-import jwt
-from django.conf import settings
+from .profile_cache import get_profile
 
 def convert_dates(obj):
     """
@@ -18,44 +17,43 @@ def convert_dates(obj):
     else:
         return obj
 
+def profile_update_event(user: dict) -> dict:
+    # channel layers on Redis serialize with msgpack, which has no datetime
+    return {"type": "profile_update", "user": convert_dates(user)}
+
 class ProfileConsumer(AsyncWebsocketConsumer):
     async def connect(self):
-        # Get token from query string
-        token = self.scope.get("query_string").decode().split("token=")[-1]
+        # Token from the query string, already verified by JWTAuthMiddleware
+        payload = self.scope.get("token_claims")
+        if not payload:
+            await self.close(code=4001)  # Custom code for missing, expired or invalid token
+            return
         
-        if not token:
+        user_id = payload.get("user_id")
+        if not user_id:
             await self.close()
             return
-        
-        try:
-            # Verify JWT token
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-            user_id = payload.get("user_id")
-            
-            if not user_id:
-                await self.close()
-                return
-                
-            self.user_id = user_id
-            self.group_name = f"user_{user_id}"
             
-            await self.channel_layer.group_add(self.group_name, self.channel_name)
-            await self.accept()
-            
-        except jwt.ExpiredSignatureError:
-            await self.close(code=4001)  # Custom code for expired token
-        except jwt.InvalidTokenError:
-            await self.close(code=4001)  # Custom code for invalid token
-        except Exception as e:
-            await self.close()
+        self.user_id = user_id
+        self.group_name = f"user_{user_id}"
+        
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        
+        # First frame is the current profile, from the same cache as the profile endpoint
+        profile = await get_profile(user_id)
+        if profile is not None:
+            await self.send(text_data=json.dumps({
+                "type": "profile",
+                "user": convert_dates(profile)
+            }))
 
     async def disconnect(self, close_code):
         if hasattr(self, "group_name"):
             await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
     async def profile_update(self, event):
-        user_data = convert_dates(event["user"])
         await self.send(text_data=json.dumps({
             "type": "profile_update",
-            "user": user_data
+            "user": event["user"]
         }))
\ No newline at end of file
@@ -0,0 +1,38 @@
+from typing import List
+
+from pymongo import ASCENDING, IndexModel
+
+from config.config import MongoClientSingleton
+
+# Indexes the queries rely on, per collection. Username and email uniqueness comes from
+# these: inserts and updates that would duplicate one fail with DuplicateKeyError
+INDEXES = {
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "homes": [
+        IndexModel([("members", ASCENDING)], name="members"),
+        IndexModel([("invited", ASCENDING)], name="invited"),
+    ],
+}
+
+
+def ensure_indexes(db=None) -> List[str]:
+    """Create any missing index, returns the names of all of them (no-op for existing ones)"""
+    db = db if db is not None else MongoClientSingleton.get_db()
+    names = []
+    for collection, indexes in INDEXES.items():
+        names += db[collection].create_indexes(indexes)
+    return names
+
+
+def missing_indexes(db=None) -> List[str]:
+    db = db if db is not None else MongoClientSingleton.get_db()
+    missing = []
+    for collection, indexes in INDEXES.items():
+        existing = db[collection].index_information()
+        missing += [f"{collection}.{index.document['name']}" for index in indexes
+                    if index.document["name"] not in existing]
+    return missing
+
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from pymongo.errors import OperationFailure, PyMongoError
+
+from user.indexes import ensure_indexes, missing_indexes
+
+
+class Command(BaseCommand):
+    help = "Create the MongoDB indexes the users and homes lookups rely on"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true",
+                            help="Only report missing indexes, exit with an error if there are any")
+
+    def handle(self, *args, **options):
+        try:
+            if options["check"]:
+                missing = missing_indexes()
+                if missing:
+                    raise CommandError(f"Missing indexes: {', '.join(missing)}")
+                self.stdout.write(self.style.SUCCESS("All indexes present"))
+                return
+            names = ensure_indexes()
+        except OperationFailure as exc:
+            if exc.code == 11000:
+                raise CommandError(f"Existing documents break a unique index, remove the duplicates first: {exc}")
+            raise CommandError(str(exc))
+        except PyMongoError as exc:
+            raise CommandError(f"MongoDB unavailable: {exc}")
+        self.stdout.write(self.style.SUCCESS(f"Indexes ensured: {', '.join(names)}"))
@@ -0,0 +1,59 @@
+import threading
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from main.metrics import register
+from . import store
+
+# Sanitized user documents (no password, string _id) by user_id, read through from Mongo.
+# Own cache alias so profiles can't evict device state, bounded by PROFILE_CACHE_SIZE
+# entries locally or by Redis maxmemory, entries expire after PROFILE_CACHE_TTL
+PROFILE_KEY = "profile_{}"
+
+_lock = threading.Lock()
+_counts = {"hits": 0, "misses": 0}
+
+
+def _count(name: str):
+    with _lock:
+        _counts[name] += 1
+
+
+def sanitize(user_data: dict) -> dict:
+    user_data.pop("password", None)
+    user_data["_id"] = str(user_data["_id"])
+    return user_data
+
+
+async def get_profile(user_id: str) -> Optional[dict]:
+    cache = caches["profiles"]
+    profile = await cache.aget(PROFILE_KEY.format(user_id))
+    if profile is not None:
+        _count("hits")
+        return profile
+    _count("misses")
+    user_data = await store.get_user(user_id)
+    if user_data is None:
+        return None
+    profile = sanitize(user_data)
+    await cache.aset(PROFILE_KEY.format(user_id), profile, timeout=settings.PROFILE_CACHE_TTL)
+    return profile
+
+
+async def set_profile(user_id: str, profile: dict):
+    # after an update the fresh document replaces the cached one
+    await caches["profiles"].aset(PROFILE_KEY.format(user_id), profile, timeout=settings.PROFILE_CACHE_TTL)
+
+
+async def forget_profile(user_id: str):
+    await caches["profiles"].adelete(PROFILE_KEY.format(user_id))
+
+
+@register("profile_cache")
+def stats() -> dict:
+    with _lock:
+        hits, misses = _counts["hits"], _counts["misses"]
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_ratio": hits / total if total else 0.0}
@@ -0,0 +1,60 @@
+from typing import Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from config.config import AsyncMongoClientSingleton
+
+# Async access to the users collection, shared by the auth and user views
+
+
+def users():
+    return AsyncMongoClientSingleton.get_db()["users"]
+
+
+async def get_user(user_id: str) -> Optional[dict]:
+    return await users().find_one({"_id": ObjectId(user_id)})
+
+
+async def find_by_login(username_or_email: str) -> Optional[dict]:
+    return await users().find_one({
+        "$or": [
+            {"username": username_or_email},
+            {"email": username_or_email}
+        ]
+    })
+
+
+def duplicate_field(exc: DuplicateKeyError) -> str:
+    # which unique index a DuplicateKeyError came from, "username" or "email"
+    key_pattern = (exc.details or {}).get("keyPattern") or {}
+    if key_pattern:
+        return next(iter(key_pattern))
+    return "email" if "email" in str(exc) else "username"
+
+
+async def create_user(user_doc: dict) -> str:
+    # raises DuplicateKeyError if the username or email is taken
+    result = await users().insert_one(user_doc)
+    return str(result.inserted_id)
+
+
+async def update_profile(user_id: str, fields: dict) -> Optional[dict]:
+    """
+    Set profile fields and return the updated user without its password, in one round trip.
+    None when nothing changed (every field already had that value) or the user doesn't exist.
+    Raises DuplicateKeyError if a new username or email is taken
+    """
+    return await users().find_one_and_update(
+        {"_id": ObjectId(user_id), "$or": [{field: {"$ne": value}} for field, value in fields.items()]},
+        {"$set": fields},
+        projection={"password": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def update_user(user_id: str, fields: dict) -> int:
+    # raises DuplicateKeyError if a new username or email is taken
+    result = await users().update_one({"_id": ObjectId(user_id)}, {"$set": fields})
+    return result.modified_count
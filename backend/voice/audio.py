@@ -0,0 +1,105 @@
+from typing import Optional
+
+import numpy as np
+
+# Input rates a client may send at, audio is converted to the session's rate on arrival
+INPUT_RATES = (8000, 16000, 22050, 24000, 32000, 44100, 48000)
+MAX_CHANNELS = 2
+
+
+def float32_to_int16(samples) -> bytes:
+    # float32 samples in [-1, 1] (clipped) to int16 little endian PCM bytes
+    clipped = np.clip(np.asarray(samples, dtype=np.float32), -1.0, 1.0)
+    return (clipped * 32767.0).astype("<i2").tobytes()
+
+
+def int16_to_float32(pcm) -> np.ndarray:
+    # int16 PCM bytes to float32 samples in [-1, 1)
+    return np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+
+
+def downmix(pcm, channels: int) -> bytes:
+    # interleaved int16 PCM of `channels` channels to mono, by averaging them.
+    # Whole sample frames only, PCMConverter carries a split one over to the next message
+    if channels == 1:
+        return bytes(pcm)
+    samples = np.frombuffer(pcm, dtype="<i2")
+    frames = samples.reshape(-1, channels)
+    return frames.mean(axis=1, dtype=np.float32).astype("<i2").tobytes()
+
+
+class Resampler:
+    """
+    Streaming int16 mono resampler, one per stream: chunks can be any length, samples
+    that don't make a whole output sample yet are kept for the next chunk.
+    Whole-number downsampling (48 -> 16 kHz) averages each group of input samples, the
+    averaging doubles as the anti-alias filter; other ratios interpolate linearly
+    """
+
+    def __init__(self, from_rate: int, to_rate: int):
+        self.from_rate = from_rate
+        self.to_rate = to_rate
+        self.factor = from_rate // to_rate if from_rate % to_rate == 0 else 0
+        self.step = from_rate / to_rate
+        self._carry = np.empty(0, dtype=np.float32)
+        self._pos = 0.0  # position of the next output sample in the carried input
+
+    def process(self, pcm) -> bytes:
+        samples = np.frombuffer(pcm, dtype="<i2").astype(np.float32)
+        if len(self._carry):
+            samples = np.concatenate((self._carry, samples))
+        if self.factor:
+            whole = len(samples) - len(samples) % self.factor
+            out = samples[:whole].reshape(-1, self.factor).mean(axis=1)
+            self._carry = samples[whole:]
+        elif len(samples):
+            # output samples that have both neighbours available
+            count = max(0, int(np.ceil((len(samples) - 1 - self._pos) / self.step)))
+            out = np.interp(self._pos + self.step * np.arange(count), np.arange(len(samples)), samples)
+            # the last sample is kept, the next output may lie between it and the next chunk
+            end = self._pos + self.step * count
+            consumed = min(int(end), len(samples) - 1)
+            self._pos = end - consumed
+            self._carry = samples[consumed:]
+        else:
+            out = samples
+        return np.round(out).astype("<i2").tobytes()
+
+
+def resample(pcm, from_rate: int, to_rate: int) -> bytes:
+    # one-off conversion of a whole buffer
+    if from_rate == to_rate:
+        return bytes(pcm)
+    return Resampler(from_rate, to_rate).process(pcm)
+
+
+def input_format(rate: Optional[str], channels: Optional[str], default_rate: int):
+    # (sample rate, channels) a client asked to send, the defaults for anything unsupported
+    rate = int(rate) if rate and rate.isdigit() and int(rate) in INPUT_RATES else default_rate
+    channels = int(channels) if channels and channels.isdigit() and 1 <= int(channels) <= MAX_CHANNELS else 1
+    return rate, channels
+
+
+class PCMConverter:
+    # What a client sends (rate, channels) to the session's mono PCM, per stream.
+    # Messages can be any length, bytes of a sample frame split across two are carried over
+    def __init__(self, sample_rate: int, channels: int, target_rate: int):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.frame_bytes = 2 * channels
+        self.resampler: Optional[Resampler] = (
+            Resampler(sample_rate, target_rate) if sample_rate != target_rate else None
+        )
+        self._carry = b""
+
+    def convert(self, pcm) -> bytes:
+        if self._carry:
+            pcm = self._carry + bytes(pcm)
+        whole = len(pcm) - len(pcm) % self.frame_bytes
+        self._carry = bytes(pcm[whole:])
+        pcm = pcm[:whole]
+        if self.channels > 1:
+            pcm = downmix(pcm, self.channels)
+        if self.resampler is not None:
+            pcm = self.resampler.process(pcm)
+        return bytes(pcm)
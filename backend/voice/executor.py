@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RecognitionQueueFull(Exception):
+    pass
+
+
+# Recognition pool using singleton principle, one per worker process
+# so blocking recognizer calls never run on the asyncio loop
+class RecognitionPool:
+    _instance = None
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="recognizer")
+        # bounds running + waiting jobs, released from the worker thread when a job finishes
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self.max_queue = max_queue
+
+    @classmethod
+    def get_pool(cls):
+        if cls._instance is None:
+            cls._instance = cls(
+                max_workers=settings.SPEECH_RECOGNITION_WORKERS,
+                max_queue=settings.SPEECH_RECOGNITION_QUEUE_SIZE,
+            )
+        return cls._instance
+
+    def submit(self, fn: Callable, *args) -> asyncio.Future:
+        # Schedule fn(*args) on the pool, raises RecognitionQueueFull instead of queueing forever
+        if not self._slots.acquire(blocking=False):
+            raise RecognitionQueueFull(f"{self.max_queue} recognitions already pending")
+        try:
+            job = self.executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        job.add_done_callback(lambda _: self._slots.release())
+        return asyncio.wrap_future(job)
+
+
+class SessionRecognizer:
+    # Per-socket front of the shared pool. Utterances are transcribed concurrently
+    # but results are handed to on_result in the order they were submitted
+    def __init__(self, on_result: Callable[[str], Awaitable[None]],
+                 pool: Optional[RecognitionPool] = None, timeout: Optional[float] = None):
+        self.pool = pool or RecognitionPool.get_pool()
+        self.on_result = on_result
+        self.timeout = settings.SPEECH_RECOGNITION_TIMEOUT if timeout is None else timeout
+        self.pending: asyncio.Queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._drain())
+
+    def submit(self, fn: Callable, *args, on_result: Optional[Callable[[str], Awaitable[None]]] = None):
+        # on_result overrides the session callback for this job only
+        self.pending.put_nowait((self.pool.submit(fn, *args), on_result or self.on_result))
+
+    def submit_result(self, text: str, on_result: Optional[Callable[[str], Awaitable[None]]] = None):
+        # A result known without recognizing (cached), still delivered after the earlier ones
+        done = asyncio.get_running_loop().create_future()
+        done.set_result(text)
+        self.pending.put_nowait((done, on_result or self.on_result))
+
+    async def _drain(self):
+        while True:
+            job, on_result = await self.pending.get()
+            try:
+                text = await asyncio.wait_for(job, self.timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Speech recognition timed out after %ss", self.timeout)
+                text = ""
+            except Exception:
+                logger.exception("Speech recognition failed")
+                text = ""
+
+            try:
+                await on_result(text)
+            except Exception:
+                logger.exception("Failed to deliver recognition result")
+
+    async def close(self):
+        # Socket went away: stop delivering and drop work that has not started yet
+        self.task.cancel()
+        while not self.pending.empty():
+            job, _ = self.pending.get_nowait()
+            job.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
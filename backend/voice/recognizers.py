@@ -0,0 +1,244 @@
+import hashlib
+import json
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import speech_recognition as sr
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+
+class RecognitionStream:
+    # Incremental decoding of a single utterance.
+    # push() is called on the event loop and only queues audio, decode()/finish() run on
+    # recognition threads and consume whatever was pushed, in push order, exactly once
+    confidence: Optional[float] = None # of the final text, when the backend reports one
+    
+    def __init__(self):
+        # _lock only guards _pending, so push() never waits for a decode;
+        # _decode_lock keeps decodes of the stream one at a time and in order
+        self._lock = threading.Lock()
+        self._decode_lock = threading.Lock()
+        self._pending: List[bytes] = []
+        self.closed = False
+
+    def push(self, pcm: bytes):
+        with self._lock:
+            self._pending.append(pcm)
+
+    def _take(self) -> bytes:
+        with self._lock:
+            chunks, self._pending = self._pending, []
+        return b"".join(chunks)
+
+    def decode(self) -> Optional[str]:
+        # Feed new audio and return the current hypothesis, None once the stream is finished
+        with self._decode_lock:
+            if self.closed:
+                return None
+            return self.accept(self._take())
+
+    def finish(self) -> str:
+        with self._decode_lock:
+            if self.closed:
+                return ""
+            self.closed = True
+            return self.final(self._take())
+
+    def accept(self, pcm: bytes) -> str:
+        raise NotImplementedError
+
+    def final(self, pcm: bytes) -> str:
+        raise NotImplementedError
+
+
+class BaseRecognizer:
+    # A recognizer turns one utterance of raw int16 mono PCM into text.
+    # Instances are created once per worker process and shared by the recognition
+    # threads, so anything expensive (clients, models) belongs in __init__
+    supports_streaming = False
+
+    def __init__(self, **options):
+        self.options = options
+
+    def recognize(self, pcm: bytes, sample_rate: int, lang: str = "en-US") -> str:
+        raise NotImplementedError
+
+    def recognize_scored(self, pcm: bytes, sample_rate: int, lang: str = "en-US") -> Tuple[str, Optional[float]]:
+        # (text, confidence in [0, 1] or None if the backend doesn't report one)
+        return self.recognize(pcm, sample_rate, lang), None
+
+    def open_stream(self, sample_rate: int, lang: str = "en-US") -> Optional[RecognitionStream]:
+        # Streaming backends return a RecognitionStream for partial results
+        return None
+
+
+class GoogleRecognizer(BaseRecognizer):
+    # Google Web Speech API through SpeechRecognition (network round trip per utterance)
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.recognizer = sr.Recognizer()
+        self.key = options.get("key")
+
+    def recognize(self, pcm: bytes, sample_rate: int, lang: str = "en-US") -> str:
+        audio = sr.AudioData(bytes(pcm), sample_rate, 2)
+        try:
+            return self.recognizer.recognize_google(audio, key=self.key, language=lang)
+        except sr.UnknownValueError:
+            return ""
+        except Exception:
+            return ""
+
+    def recognize_scored(self, pcm: bytes, sample_rate: int, lang: str = "en-US") -> Tuple[str, Optional[float]]:
+        # same request with every alternative, the best one carries the confidence
+        audio = sr.AudioData(bytes(pcm), sample_rate, 2)
+        try:
+            result = self.recognizer.recognize_google(audio, key=self.key, language=lang, show_all=True)
+        except Exception:
+            return "", None
+        alternatives = result.get("alternative") if isinstance(result, dict) else None
+        if not alternatives:
+            return "", None
+        best = alternatives[0]
+        return best.get("transcript", ""), best.get("confidence")
+
+
+class VoskRecognizer(BaseRecognizer):
+    # Offline in-process recognition, the model is loaded once and reused by every utterance
+    supports_streaming = True
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        try:
+            from vosk import KaldiRecognizer, Model, SetLogLevel
+        except ImportError as exc:
+            raise ImproperlyConfigured("The vosk recognizer backend requires the 'vosk' package") from exc
+
+        model_path = options.get("model_path")
+        if not model_path:
+            raise ImproperlyConfigured("The vosk recognizer backend requires OPTIONS['model_path']")
+
+        SetLogLevel(-1)
+        self._kaldi = KaldiRecognizer
+        self.model = Model(model_path)
+
+    def recognize(self, pcm: bytes, sample_rate: int, lang: str = "en-US") -> str:
+        # KaldiRecognizer only holds per-stream decoding state, the model is shared
+        rec = self._kaldi(self.model, sample_rate)
+        rec.AcceptWaveform(bytes(pcm))
+        return json.loads(rec.FinalResult()).get("text", "")
+
+    def open_stream(self, sample_rate: int, lang: str = "en-US") -> RecognitionStream:
+        return VoskStream(self._kaldi(self.model, sample_rate))
+
+
+class VoskStream(RecognitionStream):
+    def __init__(self, rec):
+        super().__init__()
+        self.rec = rec
+        self.committed: List[str] = []
+
+    def _accept_waveform(self, pcm: bytes) -> bool:
+        # vosk may close a segment on its own, keep its text so the next one appends to it
+        if pcm and self.rec.AcceptWaveform(pcm):
+            self.committed.append(json.loads(self.rec.Result()).get("text", ""))
+            return True
+        return False
+
+    def _text(self, *tail: str) -> str:
+        return " ".join(part for part in (*self.committed, *tail) if part)
+
+    def accept(self, pcm: bytes) -> str:
+        if self._accept_waveform(pcm):
+            return self._text()
+        return self._text(json.loads(self.rec.PartialResult()).get("partial", ""))
+
+    def final(self, pcm: bytes) -> str:
+        self._accept_waveform(pcm)
+        return self._text(json.loads(self.rec.FinalResult()).get("text", ""))
+
+
+class StubRecognizer(BaseRecognizer):
+    # Deterministic recognizer for benchmarks and offline load tests.
+    # Audio is fingerprinted and mapped to canned text, the same audio always gives the same text
+    DEFAULT_PHRASES = ("lamp on", "lamp off", "fan on", "fan off", "ac on", "ac off", "main on", "main off")
+    supports_streaming = True
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.transcripts: Dict[str, str] = dict(options.get("transcripts", {}))
+        self.phrases: Sequence[str] = tuple(options.get("phrases", self.DEFAULT_PHRASES))
+
+    @staticmethod
+    def fingerprint(pcm: bytes) -> str:
+        return hashlib.sha1(pcm).hexdigest()
+
+    def recognize(self, pcm: bytes, sample_rate: int, lang: str = "en-US") -> str:
+        return self._lookup(self.fingerprint(pcm))
+
+    def recognize_scored(self, pcm: bytes, sample_rate: int, lang: str = "en-US") -> Tuple[str, Optional[float]]:
+        return self.recognize(pcm, sample_rate, lang), 1.0
+
+    def _lookup(self, key: str) -> str:
+        if key in self.transcripts:
+            return self.transcripts[key]
+        if not self.phrases:
+            return ""
+        return self.phrases[int(key, 16) % len(self.phrases)]
+
+    def open_stream(self, sample_rate: int, lang: str = "en-US") -> RecognitionStream:
+        return StubStream(self)
+
+
+class StubStream(RecognitionStream):
+    # Hashes audio incrementally, so the final text equals recognize() on the whole utterance.
+    # Partials reveal one more word of the current guess per decode
+    def __init__(self, recognizer: StubRecognizer):
+        super().__init__()
+        self.recognizer = recognizer
+        self.digest = hashlib.sha1()
+        self.decodes = 0
+
+    def accept(self, pcm: bytes) -> str:
+        self.digest.update(pcm)
+        self.decodes += 1
+        words = self.recognizer._lookup(self.digest.hexdigest()).split()
+        return " ".join(words[:self.decodes])
+
+    def final(self, pcm: bytes) -> str:
+        self.digest.update(pcm)
+        self.confidence = 1.0
+        return self.recognizer._lookup(self.digest.hexdigest())
+
+
+RECOGNIZER_BACKENDS = {
+    "google": GoogleRecognizer,
+    "vosk": VoskRecognizer,
+    "stub": StubRecognizer,
+}
+
+_recognizer: Optional[BaseRecognizer] = None
+_recognizer_lock = threading.Lock()
+
+
+def load_recognizer(backend: str, options: Optional[dict] = None) -> BaseRecognizer:
+    # backend is a registered name ("google", "vosk", "stub") or a dotted path to a BaseRecognizer
+    cls = RECOGNIZER_BACKENDS.get(backend)
+    if cls is None:
+        try:
+            cls = import_string(backend)
+        except ImportError as exc:
+            raise ImproperlyConfigured(f"Unknown speech recognizer backend: {backend}") from exc
+    return cls(**(options or {}))
+
+
+def get_recognizer() -> BaseRecognizer:
+    # Process-wide recognizer configured by settings.SPEECH_RECOGNIZER, built on first use
+    global _recognizer
+    if _recognizer is None:
+        with _recognizer_lock:
+            if _recognizer is None:
+                config = settings.SPEECH_RECOGNIZER
+                _recognizer = load_recognizer(config["BACKEND"], config.get("OPTIONS"))
+    return _recognizer
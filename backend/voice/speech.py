@@ -1,27 +1,26 @@
-import io
 import math
-import wave
+from collections import deque
 
 from typing import Optional, Tuple, List
-import speech_recognition as sr
-
-def float32_to_int16(pcm_f32):
-    # convert numpy-like float32 buffer [-1, 1] to int16 bytes
-    # if you send int16 from the browser already, you can skip this
-    clipped = [max(-1.0, min(1.0, x)) for x in pcm_f32]
-    return b"".join(int((x * 32767.0)).to_bytes(2, "little", signed=True) for x in clipped)
-
-def make_wav(int16_bytes: bytes, sample_rate: int = 16000, channels: int = 1) -> bytes:
-    # Wrap raw int16 PCM bytes into a wav container
-    buffer = io.BytesIO()
-    with wave.open(buffer, "wb") as wf:
-        wf.setnchannels(channels)
-        wf.setsampwidth(2) # 16-bit
-        wf.setframerate(sample_rate) # 16000
-        wf.writeframes(int16_bytes)
-    return buffer.getvalue()
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from voice.recognizers import get_recognizer
+
+def frame_features(frames: np.ndarray, zcr: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    # RMS (and zero-crossing rate if asked, zeros otherwise) of every row of a 2-D int16
+    # array of frames, in one batched pass. Rows can come from one stream or from many
+    n_frames, frame_size = frames.shape
+    wide = frames.astype(np.int64) # square in int64 so it can't overflow
+    rms = np.sqrt(np.einsum("ij,ij->i", wide, wide) / frame_size) / 32768.0
+    if not zcr:
+        return rms, np.zeros(n_frames)
+    negative = frames < 0
+    return rms, np.count_nonzero(negative[:, 1:] != negative[:, :-1], axis=1) / frame_size
 
 class SimpleVAD:
+    uses_zcr = False
+    
     def __init__(self, sr: int = 16000, frame_ms: int = 20, threshold: float = 0.01, hangover_ms: int = 600):
         self.sample_rate = sr
         self.frame_size = int(sr * frame_ms / 1000) # sample per frame
@@ -37,20 +36,38 @@ class SimpleVAD:
         n = len(frame_i16) // 2
         if n == 0:
             return 0.0
-        total = 0.0
-        for i in range(0, len(frame_i16), 2):
-            s = int.from_bytes(frame_i16[i:i+2], "little", signed=True)
-            total += (s * s)
+        # read the frame in place as int16 and square in int64 so it can't overflow
+        samples = np.frombuffer(frame_i16, dtype="<i2", count=n).astype(np.int64)
+        total = float(np.dot(samples, samples))
         rms = math.sqrt(total / n) / 32768.0
         return rms
 
+    def frame_features(self, pcm_i16) -> Tuple[np.ndarray, np.ndarray]:
+        # Features of every whole frame in pcm_i16, computed in one batched call.
+        # The buffer is viewed as int16 without copying, trailing partial frame is ignored
+        n_frames = len(pcm_i16) // (self.frame_size * 2)
+        samples = np.frombuffer(pcm_i16, dtype="<i2", count=n_frames * self.frame_size)
+        return frame_features(samples.reshape(n_frames, self.frame_size), self.uses_zcr)
+
     def is_speech_frame(self, frame_i16: bytes) -> bool:
         # return True if frame_i16 is greater than threshold
         return self._rms(frame_i16) >= self.threshold
 
     def update(self, frame_i16: bytes) -> Tuple[bool, bool]:
         # checks if it's a speech, this function is called repeatedly
-        speechy = self.is_speech_frame(frame_i16)
+        return self._step(self.is_speech_frame(frame_i16))
+
+    def update_many(self, pcm_i16) -> List[Tuple[bool, bool]]:
+        # same as calling update() on every whole frame of pcm_i16,
+        # but the energy of all frames is computed at once
+        return self.decide(*self.frame_features(pcm_i16))
+
+    def decide(self, rms: np.ndarray, zcr: np.ndarray) -> List[Tuple[bool, bool]]:
+        # (start, end) of each frame from features computed beforehand, in frame order
+        speechy = rms >= self.threshold
+        return [self._step(flag) for flag in speechy.tolist()]
+
+    def _step(self, speechy: bool) -> Tuple[bool, bool]:
         start = False
         end = False
         
@@ -68,72 +85,271 @@ class SimpleVAD:
                     self.silence_count = 0
                     
         return start, end
+
+class AdaptiveVAD(SimpleVAD):
+    # Thresholds relative to a per-session noise floor instead of a fixed level:
+    #  - the first calibration_ms of audio only measure the room
+    #  - the floor is an EMA of the frame RMS (time constant adapt_ms). It follows a quieter
+    #    room faster (release_ms), and while in speech only creeps up (speech_adapt_ms),
+    #    so steady noise taken for speech still ends
+    #  - hysteresis: speech starts above floor * start_ratio, goes on above floor * stop_ratio
+    #  - with max_zcr set, a frame crossing zero more often than that can't start speech
+    #    (breaths, hiss), voiced onsets cross it far less
+    def __init__(self, sr: int = 16000, frame_ms: int = 20, hangover_ms: int = 600,
+                 start_ratio: float = 3.0, stop_ratio: float = 1.8, min_floor: float = 0.002,
+                 adapt_ms: int = 1000, speech_adapt_ms: int = 4000, release_ms: int = 200,
+                 calibration_ms: int = 200, max_zcr: float = 0.0):
+        super().__init__(sr=sr, frame_ms=frame_ms, threshold=min_floor * start_ratio, hangover_ms=hangover_ms)
+        self.start_ratio = start_ratio
+        self.stop_ratio = stop_ratio
+        self.min_floor = min_floor
+        self.alpha = min(1.0, frame_ms / adapt_ms)
+        self.speech_alpha = min(1.0, frame_ms / speech_adapt_ms)
+        self.release_alpha = min(1.0, frame_ms / release_ms)
+        self.calibration_frames = calibration_ms // frame_ms
+        self.max_zcr = max_zcr
+        self.noise_floor = min_floor
+        self.frames_seen = 0
+
+    @property
+    def uses_zcr(self) -> bool:
+        return bool(self.max_zcr)
+
+    def is_speech_frame(self, frame_i16: bytes) -> bool:
+        rms, zcr = self.frame_features(frame_i16)
+        return self._classify(float(rms[0]), float(zcr[0])) if len(rms) else False
+
+    def decide(self, rms: np.ndarray, zcr: np.ndarray) -> List[Tuple[bool, bool]]:
+        return [self._step(self._classify(r, z)) for r, z in zip(rms.tolist(), zcr.tolist())]
+
+    def _classify(self, rms: float, zcr: float) -> bool:
+        self.frames_seen += 1
+        if self.frames_seen <= self.calibration_frames:
+            # running mean of the room before anything counts as speech
+            self.noise_floor = max(self.min_floor, self.noise_floor + (rms - self.noise_floor) / self.frames_seen)
+            return False
+
+        if self.in_speech:
+            speechy = rms >= self.noise_floor * self.stop_ratio
+        else:
+            speechy = rms >= self.noise_floor * self.start_ratio and not (self.max_zcr and zcr > self.max_zcr)
+
+        alpha = self.speech_alpha if speechy or self.in_speech else self.alpha
+        if rms < self.noise_floor:
+            alpha = self.release_alpha
+        self.noise_floor = max(self.min_floor, self.noise_floor + alpha * (rms - self.noise_floor))
+        return speechy
     
+def make_vad(sample_rate: int = 16000, frame_ms: int = 20) -> SimpleVAD:
+    # VAD for a new session as configured by the SPEECH_VAD_* settings
+    if settings.SPEECH_VAD_MODE == "fixed":
+        return SimpleVAD(sr=sample_rate, frame_ms=frame_ms, threshold=settings.SPEECH_VAD_THRESHOLD,
+                         hangover_ms=settings.SPEECH_VAD_HANGOVER_MS)
+    if settings.SPEECH_VAD_MODE != "adaptive":
+        raise ImproperlyConfigured(f"Unknown SPEECH_VAD_MODE: {settings.SPEECH_VAD_MODE}")
+    return AdaptiveVAD(sr=sample_rate, frame_ms=frame_ms, hangover_ms=settings.SPEECH_VAD_HANGOVER_MS,
+                       start_ratio=settings.SPEECH_VAD_START_RATIO, stop_ratio=settings.SPEECH_VAD_STOP_RATIO,
+                       min_floor=settings.SPEECH_VAD_MIN_FLOOR, calibration_ms=settings.SPEECH_VAD_CALIBRATION_MS,
+                       max_zcr=settings.SPEECH_VAD_MAX_ZCR)
+
+class PreRollBuffer:
+    # Circular buffer of the last few frames heard outside an utterance,
+    # so the onset just before the VAD triggers can be put back in front of it
+    def __init__(self, frame_bytes: int, frames: int):
+        self.frame_bytes = frame_bytes
+        self.capacity = frames
+        self._buf = bytearray(frame_bytes * frames)
+        self._view = memoryview(self._buf)
+        self.head = 0 # slot the next frame goes to
+        self.count = 0
+        
+    def clear(self):
+        self.count = 0
+        
+    def extend(self, frames: memoryview):
+        # Only the newest `capacity` frames of a run can survive, so only those are copied
+        fb = self.frame_bytes
+        keep = min(len(frames) // fb, self.capacity)
+        if keep == 0:
+            return
+        src = frames[len(frames) - keep * fb:]
+        first = min(keep, self.capacity - self.head)
+        self._view[self.head * fb:(self.head + first) * fb] = src[:first * fb]
+        if keep > first:
+            self._view[:(keep - first) * fb] = src[first * fb:]
+        self.head = (self.head + keep) % self.capacity
+        self.count = min(self.capacity, self.count + keep)
+        
+    def write_into(self, dest: memoryview) -> int:
+        # Copy the buffered frames, oldest first, to the start of dest. Returns bytes written
+        fb = self.frame_bytes
+        if self.count == 0:
+            return 0
+        oldest = (self.head - self.count) % self.capacity
+        first = min(self.count, self.capacity - oldest)
+        dest[:first * fb] = self._view[oldest * fb:(oldest + first) * fb]
+        if self.count > first:
+            dest[first * fb:self.count * fb] = self._view[:(self.count - first) * fb]
+        return self.count * fb
+
 class SpeechSession:
     # Buffers incoming int16 pcm frames, segments utterances via VAD
-    def __init__(self, sample_rate: int = 16000, frame_ms: int = 20):
+    def __init__(self, sample_rate: int = 16000, frame_ms: int = 20, partial_ms: int = 0,
+                 max_utterance_ms: int = 10000, preroll_ms: int = 0, trailing_silence_ms: int = 600,
+                 vad: Optional[SimpleVAD] = None):
         self.sample_rate = sample_rate
         self.frame_ms = frame_ms
         self.frame_bytes = int(sample_rate * frame_ms / 1000) * 2 # int 16
-        self.vad = SimpleVAD(sr=sample_rate, frame_ms=frame_ms, threshold=0.01, hangover_ms=600)
-        self.current_utt: List[bytes] = []
-        self.completed_audio: Optional[bytes] = None
+        # fixed 0.01 RMS threshold unless the caller passes another VAD (see make_vad)
+        self.vad = vad or SimpleVAD(sr=sample_rate, frame_ms=frame_ms, threshold=0.01, hangover_ms=600)
+        max_frames = max(1, max_utterance_ms // frame_ms)
+        # frames heard just before speech starts are kept and prepended to the utterance
+        self.preroll = PreRollBuffer(self.frame_bytes, min(preroll_ms // frame_ms, max_frames - 1))
+        # hangover silence beyond this is dropped from the end of a finished utterance
+        self.trailing_silence_frames = trailing_silence_ms // frame_ms
+        # bytes of a frame split across two websocket messages
+        self._carry = bytearray(self.frame_bytes)
+        self.carry_len = 0
+        # audio waiting for the next scheduler tick in batched mode (voice/scheduler.py)
+        self._queued = bytearray()
+        # the utterance in progress is written in place into a fixed buffer,
+        # a stuck VAD cuts the utterance at max_utterance_ms instead of growing memory
+        self.max_utterance_bytes = max_frames * self.frame_bytes
+        self._utt = bytearray(self.max_utterance_bytes)
+        self._utt_view = memoryview(self._utt)
+        self.utt_len = 0
+        self.in_utterance = False
+        # finished utterances not yet taken, oldest first: one chunk or tick can end several
+        # (a max-length cut then an end, a long message, a late scheduler tick)
+        self._completed: deque = deque()  # (audio, bytes of it already handed out as partials)
+        # incremental mode: hand out in-progress audio every partial_ms (0 = off)
+        self.partial_bytes = (partial_ms // frame_ms) * self.frame_bytes
+        self.streamed_bytes = 0 # bytes of the utterance in progress already handed out
         
     def add_chunk(self, chunk: bytes) -> Optional[bool]:
-        # Add raw int16 PCM chunk (multiple frames OK). Returns True if utterance just ended
+        # Add raw int16 PCM chunk (any length). Returns True if utterance just ended
+        view = memoryview(chunk)
+        ended = False
+        
+        # complete the frame left over from the previous chunk first
+        if self.carry_len:
+            head = view[:self.frame_bytes - self.carry_len]
+            self._carry[self.carry_len:self.carry_len + len(head)] = head
+            self.carry_len += len(head)
+            view = view[len(head):]
+            if self.carry_len < self.frame_bytes:
+                return None
+            self.carry_len = 0
+            ended = self._process_frames(memoryview(self._carry))
         
-        # Slice chunk into exact frames for VAD
+        whole = len(view) - len(view) % self.frame_bytes
+        if whole:
+            ended = self._process_frames(view[:whole]) or ended
+        
+        # keep the trailing partial frame until the next chunk arrives
+        leftover = view[whole:]
+        if leftover:
+            self._carry[:len(leftover)] = leftover
+            self.carry_len = len(leftover)
+        
+        return True if ended else None
+    
+    def queue_chunk(self, chunk: bytes):
+        # Batched mode: keep the chunk until the scheduler runs the VAD for every session at once
+        self._queued += chunk
+    
+    def take_queued_frames(self) -> bytes:
+        # The whole frames queued so far, a trailing partial frame waits for the next chunk
+        whole = len(self._queued) - len(self._queued) % self.frame_bytes
+        frames = bytes(self._queued[:whole])
+        del self._queued[:whole]
+        return frames
+    
+    def add_frames(self, frames: memoryview, decisions: List[Tuple[bool, bool]]) -> Optional[bool]:
+        # Whole frames with their VAD decisions already made, returns like add_chunk
+        return True if self._process_frames(frames, decisions) else None
+    
+    def _process_frames(self, frames: memoryview, decisions: Optional[List[Tuple[bool, bool]]] = None) -> bool:
+        # Run VAD over every whole frame in one pass and copy speech frames into the utterance buffer
         ended = False
         pos = 0
-        while pos + self.frame_bytes <= len(chunk):
-            frame = chunk[pos:pos + self.frame_bytes]
+        idle_from = None if self.in_utterance else 0 # start of the non-speech run in this batch
+        if decisions is None:
+            decisions = self.vad.update_many(frames)
+        for start, end in decisions:
+            if start:
+                # Starting to collect, onset frames from before the trigger go first
+                self.in_utterance = True
+                self.preroll.extend(frames[idle_from:pos])
+                self.utt_len = self.preroll.write_into(self._utt_view)
+                self.preroll.clear()
+            if self.in_utterance:
+                self._utt[self.utt_len:self.utt_len + self.frame_bytes] = frames[pos:pos + self.frame_bytes]
+                self.utt_len += self.frame_bytes
             pos += self.frame_bytes
             
-            start, end = self.vad.update(frame)
-            if start and not self.current_utt:
-                # Starting to collect
-                self.current_utt.append(frame)
-            elif self.current_utt:
-                self.current_utt.append(frame)
-                
-            if end and self.current_utt:
-                # finalize current utterance
-                self.completed_audio = b"".join(self.current_utt)
-                self.current_utt = []
+            if end and self.in_utterance:
+                # finalize current utterance without most of the hangover silence
+                self.in_utterance = False
+                self._complete_utterance(trim_frames=self.vad.hangover_frames)
+                idle_from = pos
+                ended = True
+            elif self.utt_len >= self.max_utterance_bytes:
+                # still speech but the buffer is full, cut here and keep collecting into a new one
+                self._complete_utterance()
                 ended = True
-                
-        leftover = chunk[pos:]
-        if leftover:
-            # if we had leftover, just buffer them until next chunk arrives
-            pass
         
-        return True if ended else None
+        if not self.in_utterance:
+            self.preroll.extend(frames[idle_from:])
+        
+        return ended
+    
+    def _complete_utterance(self, trim_frames: int = 0):
+        # trim_frames trailing frames are known to be silence, keep only trailing_silence_frames of them
+        trim_frames = min(trim_frames, self.utt_len // self.frame_bytes) - self.trailing_silence_frames
+        length = self.utt_len - max(0, trim_frames) * self.frame_bytes
+        self._completed.append((bytes(self._utt_view[:length]), min(self.streamed_bytes, length)))
+        self.utt_len = 0
+        self.streamed_bytes = 0
     
     def has_completed(self) -> bool:
-        # return audio if it's not none
-        return self.completed_audio is not None
+        return bool(self._completed)
+    
+    @property
+    def completed_streamed(self) -> int:
+        # bytes of the next completed utterance already handed out by pop_partial_audio
+        return self._completed[0][1] if self._completed else 0
     
-    def pop_completed_wav(self) -> Optional[bytes]:
-        if self.completed_audio is None:
+    def pop_completed_audio(self) -> Optional[bytes]:
+        # return the oldest finished utterance as raw int16 PCM and remove it
+        return self._completed.popleft()[0] if self._completed else None
+    
+    def pop_partial_audio(self) -> Optional[bytes]:
+        # In incremental mode, return the in-progress audio not handed out yet
+        # once at least partial_ms of it has built up. Each frame is returned only once
+        if not self.partial_bytes:
+            return None
+        if self.utt_len - self.streamed_bytes < self.partial_bytes:
             return None
         
-        wav = make_wav(self.completed_audio, sample_rate=self.sample_rate, channels=1)
-        self.completed_audio = None
-        return wav
+        audio = bytes(self._utt_view[self.streamed_bytes:self.utt_len])
+        self.streamed_bytes = self.utt_len
+        return audio
     
     def recognize_last(self, lang: str = "en_US") -> Optional[str]:
-        wav_bytes = self.pop_completed_wav()
-        if not wav_bytes:
+        audio = self.pop_completed_audio()
+        if not audio:
             return None
         
-        # Now recognize the audio_wav created by pop_completed_wav
-        r = sr.Recognizer()
-        with sr.AudioFile(io.BytesIO(wav_bytes)) as source:
-            audio = r.record(source)
-            
-        try:
-            return r.recognize_google(audio, language=lang)
-        except sr.UnknownValueError:
-            return ""
-        except Exception:
-            return ""
\ No newline at end of file
+        return recognize_pcm(audio, sample_rate=self.sample_rate, lang=lang)
+
+
+def recognize_pcm(pcm: bytes, sample_rate: int = 16000, lang: str = "en_US") -> str:
+    # Blocking recognition of raw int16 PCM on the configured backend,
+    # safe to run on a worker thread
+    return get_recognizer().recognize(pcm, sample_rate, lang=lang)
+
+
+def recognize_pcm_scored(pcm: bytes, sample_rate: int = 16000, lang: str = "en_US") -> Tuple[str, Optional[float]]:
+    # recognize_pcm with the backend's confidence, None if it has none
+    return get_recognizer().recognize_scored(pcm, sample_rate, lang=lang)
@@ -0,0 +1,106 @@
+import threading
+import time
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from voice.audio import PCMConverter
+from voice.recognizers import RecognitionStream
+from voice.speech import SpeechSession, make_vad
+from voice.transcript_cache import TranscriptCache, fingerprint
+
+SAMPLE_RATE = 16000
+
+
+def tone(hz, ms, rms=0.25):
+    # a tone with silence before and after, as the VAD hands an utterance over
+    t = np.arange(SAMPLE_RATE * ms // 1000) / SAMPLE_RATE
+    audio = np.concatenate((np.zeros(3200), np.sin(2 * np.pi * hz * t) * rms * np.sqrt(2), np.zeros(3200)))
+    return (audio * 32767).astype("<i2").tobytes()
+
+
+class TranscriptCacheTests(SimpleTestCase):
+    def cache(self):
+        return TranscriptCache(max_entries=100, per_key=10, min_similarity=0.97, min_confidence=0.85)
+
+    def test_short_utterances_do_not_collide(self):
+        # fewer frames than the fingerprint has slices
+        low, high = fingerprint(tone(300, 400), SAMPLE_RATE), fingerprint(tone(900, 400), SAMPLE_RATE)
+        self.assertTrue(np.isfinite(low.profile).all())
+        self.assertNotEqual(low.digest, high.digest)
+        cache = self.cache()
+        cache.store("user", low, "lamp on", 1.0, 0.1)
+        self.assertIsNone(cache.lookup("user", high))
+
+    def test_replay_hits(self):
+        cache = self.cache()
+        cache.store("user", fingerprint(tone(300, 400), SAMPLE_RATE), "lamp on", 1.0, 0.1)
+        self.assertEqual(cache.lookup("user", fingerprint(tone(300, 400, rms=0.05), SAMPLE_RATE)), "lamp on")
+        self.assertIsNone(cache.lookup("other user", fingerprint(tone(300, 400), SAMPLE_RATE)))
+
+    def test_confidence_gate(self):
+        cache = self.cache()
+        fp = fingerprint(tone(300, 400), SAMPLE_RATE)
+        cache.store("user", fp, "lamp on", 0.5, 0.1)
+        cache.store("user", fp, "lamp on", None, 0.1)
+        self.assertIsNone(cache.lookup("user", fp))
+        self.assertEqual(cache.rejected, 2)
+
+    def test_too_short_or_silent(self):
+        self.assertIsNone(fingerprint(tone(300, 100), SAMPLE_RATE))
+        self.assertIsNone(fingerprint(bytes(16000), SAMPLE_RATE))
+
+
+class SpeechSessionTests(SimpleTestCase):
+    def test_one_chunk_ending_several_utterances(self):
+        t = np.arange(int(0.8 * SAMPLE_RATE)) / SAMPLE_RATE
+        word = np.concatenate((np.zeros(2 * SAMPLE_RATE), np.sin(2 * np.pi * 300 * t) * 6000))
+        pcm = np.concatenate([word] * 10 + [np.zeros(SAMPLE_RATE)]).astype("<i2").tobytes()
+        session = SpeechSession(sample_rate=SAMPLE_RATE, frame_ms=20, preroll_ms=240, trailing_silence_ms=100,
+                                vad=make_vad(SAMPLE_RATE, 20))
+        self.assertTrue(session.add_chunk(pcm))
+        utterances = list(iter(session.pop_completed_audio, None))
+        self.assertEqual(len(utterances), 10)
+        self.assertFalse(session.has_completed())
+
+
+class PCMConverterTests(SimpleTestCase):
+    def test_messages_split_inside_a_sample_frame(self):
+        rng = np.random.default_rng(0)
+        pcm = rng.normal(0, 3000, 48000 * 2).astype("<i2").tobytes()
+        whole = PCMConverter(48000, 2, 16000).convert(pcm)
+        converter = PCMConverter(48000, 2, 16000)
+        pieces = [converter.convert(pcm[offset:offset + 1001]) for offset in range(0, len(pcm), 1001)]
+        self.assertEqual(b"".join(pieces), whole)
+
+
+class SlowStream(RecognitionStream):
+    def __init__(self):
+        super().__init__()
+        self.decoding = threading.Event()
+        self.fed = []
+
+    def accept(self, pcm):
+        self.decoding.set()
+        time.sleep(0.3)
+        self.fed.append(pcm)
+        return ""
+
+    def final(self, pcm):
+        self.fed.append(pcm)
+        return ""
+
+
+class RecognitionStreamTests(SimpleTestCase):
+    def test_push_does_not_wait_for_a_decode(self):
+        stream = SlowStream()
+        stream.push(b"a")
+        worker = threading.Thread(target=stream.decode)
+        worker.start()
+        stream.decoding.wait()
+        started = time.perf_counter()
+        stream.push(b"b")
+        self.assertLess(time.perf_counter() - started, 0.1)
+        worker.join()
+        stream.finish()
+        self.assertEqual(stream.fed, [b"a", b"b"])
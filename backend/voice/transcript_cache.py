@@ -0,0 +1,205 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from main.metrics import register
+
+FRAME_MS = 20
+BANDS = 16
+SLICES = 32
+LOW_HZ, HIGH_HZ = 100, 4000
+TRIM_DB = 10  # frames this far under the loudest one are the edges around the words
+FLOOR_DB = 20  # band energies this far under the loudest are noise, floored to one value
+MIN_FRAMES = 10
+
+
+class Fingerprint:
+    """
+    Acoustic fingerprint of one utterance: the log energy of log-spaced bands over a fixed
+    number of time slices of the trimmed utterance, mean removed and unit length. Two are
+    compared by their dot product (correlation, 1.0 = same), which doesn't change with gain,
+    the silence around the words or (within limits) how fast they were said, and drops
+    slowly with background noise. `digest` is exact replays
+    """
+
+    __slots__ = ("profile", "frames", "digest")
+
+    def __init__(self, profile: np.ndarray, frames: int):
+        self.profile = profile
+        self.frames = frames
+        self.digest = hashlib.sha1(np.round(profile * 1000).astype("<i2").tobytes()).hexdigest()
+
+    def similarity(self, other: "Fingerprint") -> float:
+        return float(self.profile @ other.profile)
+
+
+def _band_edges(frame: int, sample_rate: int) -> np.ndarray:
+    high = min(HIGH_HZ, sample_rate // 2)
+    hz = np.geomspace(LOW_HZ, high, BANDS + 1)
+    return np.round(hz * frame / sample_rate).astype(int)
+
+
+def fingerprint(pcm, sample_rate: int) -> Optional[Fingerprint]:
+    # None for audio too short (or silent) to tell utterances apart
+    frame = sample_rate * FRAME_MS // 1000
+    samples = np.frombuffer(pcm, dtype="<i2")
+    count = len(samples) // frame
+    if count < MIN_FRAMES:
+        return None
+    frames = samples[:count * frame].reshape(count, frame).astype(np.float32)
+
+    energy = np.einsum("ij,ij->i", frames, frames)
+    if not energy.max():
+        return None
+    loud = np.flatnonzero(energy >= energy.max() * 10 ** (-TRIM_DB / 10))
+    if loud[-1] - loud[0] + 1 < MIN_FRAMES:
+        return None
+    frames = frames[loud[0]:loud[-1] + 1]
+
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(frame), axis=1)) ** 2
+    bands = np.add.reduceat(spectrum, _band_edges(frame, sample_rate)[:-1], axis=1)[:, :BANDS]
+    # mean band energy per slice, each slice 1/SLICES of the utterance: differences of the
+    # running sum at the slice edges, so an utterance shorter than SLICES frames has slices
+    # inside a frame (that frame's energy) rather than empty ones
+    running = np.concatenate((np.zeros((1, BANDS)), np.cumsum(bands, axis=0)))
+    edges = np.linspace(0, len(bands), SLICES + 1)
+    whole = np.minimum(edges.astype(int), len(bands) - 1)
+    at_edges = running[whole] + (edges - whole)[:, None] * bands[whole]
+    slices = np.diff(at_edges, axis=0) * SLICES / len(bands)
+    log = np.log(np.maximum(slices, slices.max() * 10 ** (-FLOOR_DB / 10)))
+    log -= log.mean()
+    norm = np.linalg.norm(log)
+    if not norm or not np.isfinite(log).all():
+        return None
+    return Fingerprint((log / norm).ravel(), len(frames))
+
+
+class TranscriptCache:
+    """
+    Transcripts of recent utterances by fingerprint, per key (user and language). A lookup
+    takes the exact digest first, otherwise the most similar fingerprint of the key, if at
+    least min_similarity and of about the same length. Bounded per key and overall,
+    least recently used out first. Shared by the sockets of the worker, lookups run on the
+    event loop and stores on recognition threads
+    """
+
+    def __init__(self, max_entries: int, per_key: int, min_similarity: float, min_confidence: float,
+                 max_length_ratio: float = 1.25):
+        self.max_entries = max_entries
+        self.per_key = per_key
+        self.min_similarity = min_similarity
+        self.min_confidence = min_confidence
+        self.max_length_ratio = max_length_ratio
+        # (key, digest) -> (fingerprint, text, recognition seconds), oldest use first
+        self._entries: "OrderedDict[Tuple[Hashable, str], Tuple[Fingerprint, str, float]]" = OrderedDict()
+        self._by_key: Dict[Hashable, "OrderedDict[str, None]"] = defaultdict(OrderedDict)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.exact_hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.rejected = 0  # recognized but under the confidence gate
+        self.saved_seconds = 0.0
+
+    def lookup(self, key: Hashable, fp: Optional[Fingerprint]) -> Optional[str]:
+        with self._lock:
+            entry = self._match(key, fp) if fp is not None else None
+            if entry is None:
+                self.misses += 1
+                return None
+            digest, (_, text, seconds) = entry
+            self.exact_hits += digest == fp.digest
+            self.hits += 1
+            self.saved_seconds += seconds
+            self._touch(key, digest)
+            return text
+
+    def _match(self, key, fp: Fingerprint):
+        entry = self._entries.get((key, fp.digest))
+        if entry is not None:
+            return fp.digest, entry
+        digests = self._by_key.get(key)
+        if not digests or self.min_similarity >= 1:
+            return None
+        candidates = [(digest, self._entries[(key, digest)]) for digest in digests]
+        candidates = [(digest, entry) for digest, entry in candidates
+                      if max(entry[0].frames, fp.frames) <= self.max_length_ratio * min(entry[0].frames, fp.frames)]
+        if not candidates:
+            return None
+        similarity = np.stack([entry[0].profile for _, entry in candidates]) @ fp.profile
+        best = int(np.argmax(similarity))
+        return candidates[best] if similarity[best] >= self.min_similarity else None
+
+    def _touch(self, key, digest: str):
+        self._entries.move_to_end((key, digest))
+        self._by_key[key].move_to_end(digest)
+
+    def store(self, key: Hashable, fp: Optional[Fingerprint], text: str, confidence: Optional[float],
+              seconds: float):
+        if fp is None or not text.strip():
+            return
+        if confidence is None or confidence < self.min_confidence:
+            with self._lock:
+                self.rejected += 1
+            return
+        with self._lock:
+            self._entries[(key, fp.digest)] = (fp, text, seconds)
+            self._by_key[key][fp.digest] = None
+            self._touch(key, fp.digest)
+            self.stored += 1
+            digests = self._by_key[key]
+            while len(digests) > self.per_key:
+                self._entries.pop((key, digests.popitem(last=False)[0]), None)
+            while len(self._entries) > self.max_entries:
+                (old_key, old_digest), _ = self._entries.popitem(last=False)
+                self._by_key[old_key].pop(old_digest, None)
+                if not self._by_key[old_key]:
+                    del self._by_key[old_key]
+
+    def remember(self, key: Hashable, fp: Optional[Fingerprint],
+                 recognize: Callable[[], Tuple[str, Optional[float]]]) -> str:
+        # Recognition job for a miss, on a recognition thread: run it, keep the text if confident
+        started = time.perf_counter()
+        text, confidence = recognize()
+        self.store(key, fp, text, confidence, time.perf_counter() - started)
+        return text
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "exact_hits": self.exact_hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "stored": self.stored,
+            "rejected": self.rejected,
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
+
+
+_cache: Optional[TranscriptCache] = None
+
+
+def get_transcript_cache() -> Optional[TranscriptCache]:
+    # Process-wide, None when SPEECH_TRANSCRIPT_CACHE is off
+    global _cache
+    if _cache is None and settings.SPEECH_TRANSCRIPT_CACHE:
+        _cache = TranscriptCache(
+            max_entries=settings.SPEECH_TRANSCRIPT_CACHE_SIZE,
+            per_key=settings.SPEECH_TRANSCRIPT_CACHE_PER_USER,
+            min_similarity=settings.SPEECH_TRANSCRIPT_CACHE_MIN_SIMILARITY,
+            min_confidence=settings.SPEECH_TRANSCRIPT_CACHE_MIN_CONFIDENCE,
+        )
+    return _cache
+
+
+@register("transcript_cache")
+def transcript_cache_stats() -> dict:
+    cache = get_transcript_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
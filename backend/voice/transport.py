@@ -0,0 +1,153 @@
+import struct
+from collections import Counter
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from main.metrics import register
+
+# Binary audio frames on the speech socket, once a format is negotiated:
+#   version (u8) | codec (u8) | sequence (u16 little endian, wraps) | payload
+# pcm16: int16 little endian PCM, mulaw: G.711 u-law bytes (half the size),
+# opus: one Opus packet. Audio is mono at the session's sample rate (Opus decodes to it)
+HEADER = struct.Struct("<BBH")
+VERSION = 1
+CODECS = {"pcm16": 0, "mulaw": 1, "opus": 2}
+
+# Process-wide counters, served at /api/metrics/
+_totals: Counter = Counter()
+
+
+class AudioFormatError(ValueError):
+    pass
+
+
+def _mulaw_table() -> np.ndarray:
+    # G.711 u-law byte -> int16 sample, for all 256 codes at once
+    u = ~np.arange(256, dtype=np.int32) & 0xFF
+    magnitude = ((((u & 0x0F) << 3) + 0x84) << ((u >> 4) & 0x07)) - 0x84
+    return np.where(u & 0x80, -magnitude, magnitude).astype("<i2")
+
+
+MULAW_TABLE = _mulaw_table()
+
+
+def decode_mulaw(data) -> bytes:
+    return MULAW_TABLE[np.frombuffer(data, dtype=np.uint8)].tobytes()
+
+
+class OpusDecoder:
+    # One per socket, Opus decoding carries state from packet to packet
+    MAX_FRAME_MS = 120
+
+    def __init__(self, sample_rate: int):
+        try:
+            import opuslib
+        except (ImportError, OSError) as exc:
+            raise ImproperlyConfigured("Opus audio requires the 'opuslib' package and libopus") from exc
+        self.decoder = opuslib.Decoder(sample_rate, 1)
+        self.max_samples = sample_rate * self.MAX_FRAME_MS // 1000
+
+    def decode(self, packet) -> bytes:
+        return self.decoder.decode(bytes(packet), self.max_samples)
+
+
+def opus_available() -> bool:
+    try:
+        import opuslib  # noqa: F401
+    except (ImportError, OSError):
+        return False
+    return True
+
+
+def available_formats() -> List[str]:
+    return [name for name in settings.SPEECH_AUDIO_FORMATS
+            if name in CODECS and (name != "opus" or opus_available())]
+
+
+def negotiate(requested: Optional[str]) -> Optional[str]:
+    """
+    Format for a client asking for `requested` (comma separated, preferred first):
+    the first one this server supports, pcm16 if none is. None when nothing is asked
+    for, the client then sends bare PCM without frame headers
+    """
+    if requested is None:
+        return None
+    available = available_formats()
+    for name in requested.split(","):
+        if name.strip() in available:
+            return name.strip()
+    return "pcm16"
+
+
+class AudioReceiver:
+    """
+    Decodes the framed audio of one socket to int16 PCM and checks the sequence numbers.
+    Frames after a gap are still used (the missing ones are counted and reported),
+    frames arriving after a later one are late and dropped so audio stays in order
+    """
+
+    def __init__(self, audio_format: str, sample_rate: int):
+        self.format = audio_format
+        self.codec = CODECS[audio_format]
+        self.expected: Optional[int] = None
+        self.received = 0
+        self.lost = 0
+        self.late = 0
+        self._decode = {
+            "pcm16": bytes,
+            "mulaw": decode_mulaw,
+            "opus": OpusDecoder(sample_rate).decode if audio_format == "opus" else None,
+        }[audio_format]
+
+    def decode(self, message: bytes) -> Tuple[Optional[bytes], int]:
+        # (PCM or None for a late frame, frames missing right before this one)
+        if len(message) < HEADER.size:
+            raise AudioFormatError("Audio frame shorter than its header")
+        version, codec, seq = HEADER.unpack_from(message)
+        if version != VERSION or codec != self.codec:
+            raise AudioFormatError(f"Expected {self.format} frames (version {VERSION})")
+
+        missing = 0
+        if self.expected is not None:
+            ahead = (seq - self.expected) & 0xFFFF
+            if ahead >= 0x8000:
+                self.late += 1
+                _totals["late"] += 1
+                return None, 0
+            missing = ahead
+        self.expected = (seq + 1) & 0xFFFF
+        self.received += 1
+        self.lost += missing
+
+        payload = memoryview(message)[HEADER.size:]
+        pcm = self._decode(payload)
+        _totals[f"{self.format}_frames"] += 1
+        _totals["bytes_in"] += len(message)
+        _totals["pcm_bytes"] += len(pcm)
+        _totals["lost"] += missing
+        return pcm, missing
+
+
+def encode_frame(codec: str, seq: int, payload: bytes) -> bytes:
+    # what a client sends, used by the benchmarks and load tests
+    return HEADER.pack(VERSION, CODECS[codec], seq & 0xFFFF) + payload
+
+
+def encode_mulaw(pcm: Sequence[int]) -> bytes:
+    # G.711 u-law encoder on 14 bit samples, as the reference one (clients encode, the server decodes)
+    samples = np.asarray(pcm, dtype=np.int32) >> 2
+    magnitude = np.minimum(np.abs(samples), 8159) + 0x21
+    exponent = np.floor(np.log2(magnitude)).astype(np.int32) - 5
+    code = np.where(exponent > 7, 0x7F, (exponent << 4) | ((magnitude >> (exponent + 1)) & 0x0F))
+    return (code ^ np.where(samples < 0, 0x7F, 0xFF)).astype(np.uint8).tobytes()
+
+
+@register("audio_transport")
+def transport_stats() -> dict:
+    stats = dict(_totals)
+    if stats.get("bytes_in"):
+        stats["compression"] = stats["pcm_bytes"] / stats["bytes_in"]
+    return stats
@@ -12,6 +12,29 @@ export async function controlDevice(device, state) {
   }
 }
 
+// Switch many devices in one request, e.g. { lamp: true, fan: false }
+export async function controlDevices(states) {
+  try {
+    const response = await apiClient.post(`/device/batch/`, { states });
+    return response.data;
+  } catch (error) {
+    throw new Error(
+      error.response?.data?.message || "Failed to control devices"
+    );
+  }
+}
+
+export async function activateScene(scene) {
+  try {
+    const response = await apiClient.post(`/device/scenes/${scene}/`);
+    return response.data;
+  } catch (error) {
+    throw new Error(
+      error.response?.data?.message || `Failed to activate ${scene}`
+    );
+  }
+}
+
 export async function getDeviceState(device) {
   try {
     const response = await apiClient.get(`/device/${device}/state/`);
@@ -45,3 +68,64 @@ export async function getAllDeviceStates() {
     );
   }
 }
+
+// Home sharing: members control and see the same devices
+export async function getHome() {
+  try {
+    const response = await apiClient.get(`/device/home/`);
+    return response.data.home;
+  } catch (error) {
+    throw new Error(error.response?.data?.error || "Failed to get home");
+  }
+}
+
+// Invites the user, they join once they accept the invitation
+export async function addHomeMember(username) {
+  try {
+    const response = await apiClient.post(`/device/home/members/`, { username });
+    return response.data.home;
+  } catch (error) {
+    throw new Error(error.response?.data?.error || `Failed to add ${username}`);
+  }
+}
+
+export async function removeHomeMember(username) {
+  try {
+    const response = await apiClient.delete(`/device/home/members/`, {
+      data: { username },
+    });
+    return response.data.home;
+  } catch (error) {
+    throw new Error(error.response?.data?.error || `Failed to remove ${username}`);
+  }
+}
+
+// Invitations to other users' homes
+export async function getHomeInvites() {
+  try {
+    const response = await apiClient.get(`/device/home/invites/`);
+    return response.data.invites;
+  } catch (error) {
+    throw new Error(error.response?.data?.error || "Failed to get invitations");
+  }
+}
+
+export async function acceptHomeInvite(home) {
+  try {
+    const response = await apiClient.post(`/device/home/invites/`, { home });
+    return response.data.home;
+  } catch (error) {
+    throw new Error(error.response?.data?.error || "Failed to accept the invitation");
+  }
+}
+
+export async function declineHomeInvite(home) {
+  try {
+    const response = await apiClient.delete(`/device/home/invites/`, {
+      data: { home },
+    });
+    return response.data.invites;
+  } catch (error) {
+    throw new Error(error.response?.data?.error || "Failed to decline the invitation");
+  }
+}
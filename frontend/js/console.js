@@ -17,7 +17,11 @@ function initProfileWS() {
 
   socket.onmessage = (evt) => {
     const data = JSON.parse(evt.data);
-    if (data.type === "profile_update") {
+    if (data.type === "profile") {
+      // current profile, sent once on connect
+      localStorage.setItem("user", JSON.stringify(data.user));
+      displayUsername();
+    } else if (data.type === "profile_update") {
       localStorage.setItem("user", JSON.stringify(data.user));
       displayUsername();
       showNotification("Profile updated", "success");
@@ -551,7 +555,18 @@ document.addEventListener("DOMContentLoaded", function () {
     audioCtx = null,
     processor = null,
     micStream = null,
-    recording = false;
+    recording = false,
+    partialTag = null;
+  // Audio format agreed in the handshake (sent once "ready" arrives), frames carry a
+  // 4 byte header: version, codec, sequence number (uint16 little endian)
+  const AUDIO_CODECS = { pcm16: 0, mulaw: 1, opus: 2 };
+  let audioFormat = null,
+    audioSeq = 0,
+    opusEncoder = null,
+    opusTimestamp = 0;
+  // Last device state version seen of the user's home, sent on reconnect to get only what was missed
+  let deviceHome = localStorage.getItem("deviceHome");
+  let deviceVersion = parseInt(localStorage.getItem("deviceVersion"), 10);
   let serverUrl = `ws://${location.hostname}:8000/ws/speech/`;
 
   // Grab UI elements
@@ -576,6 +591,34 @@ document.addEventListener("DOMContentLoaded", function () {
     statusEl.textContent = text;
   }
 
+  // Apply a snapshot or delta of device states and remember its version
+  function applyDeviceStates(data) {
+    Object.entries(data.states).forEach(([device, state]) =>
+      handleDeviceUpdate({ device, state, source: "sync" })
+    );
+    deviceHome = data.home;
+    localStorage.setItem("deviceHome", data.home);
+    setDeviceVersion(data.version);
+  }
+
+  function setDeviceVersion(version) {
+    deviceVersion = version;
+    localStorage.setItem("deviceVersion", version);
+  }
+
+  // A broadcast covers the versions after `since` up to `version` (several updates may be
+  // merged into one). Already applied ones are skipped and a gap means one was missed
+  // (or overtaken), so ask for the deltas instead
+  function acceptDeviceVersion(since, version) {
+    if (Number.isInteger(deviceVersion) && version <= deviceVersion) return false;
+    if (Number.isInteger(deviceVersion) && since > deviceVersion) {
+      socket.send(JSON.stringify({ type: "resync", since: deviceVersion }));
+      return false;
+    }
+    setDeviceVersion(version);
+    return true;
+  }
+
   /* Connect WebSocket and handle messages */
   connectBtn.onclick = () => connectWS();
   langSel.onchange = () => {
@@ -594,8 +637,14 @@ document.addEventListener("DOMContentLoaded", function () {
       return;
     }
 
-    // Add token to WebSocket URL
-    const wsUrl = `${serverUrl}?token=${encodeURIComponent(token)}`;
+    // Add token to WebSocket URL, with the audio formats we can send (preferred first)
+    const formats = await supportedAudioFormats();
+    let wsUrl = `${serverUrl}?token=${encodeURIComponent(token)}&audio=${formats.join(",")}`;
+    if (deviceHome && Number.isInteger(deviceVersion)) {
+      wsUrl += `&home=${encodeURIComponent(deviceHome)}&since=${deviceVersion}`;
+    }
+    audioFormat = null;
+    audioSeq = 0;
     socket = new WebSocket(wsUrl);
     socket.binaryType = "arraybuffer";
 
@@ -625,9 +674,30 @@ document.addEventListener("DOMContentLoaded", function () {
       try {
         const data = JSON.parse(evt.data);
         switch (data.type) {
+          case "ready":
+            audioFormat = data.audio ? data.audio.format : "pcm16";
+            log("Audio format:", audioFormat);
+            break;
+
+          case "audio_gap":
+            log("Audio frames lost:", data.missing);
+            break;
+
+          case "partial":
+            // Show the in-progress transcript, replaced when the final arrives
+            if (!partialTag) {
+              partialTag = document.createElement("div");
+              partialTag.className = "tag partial";
+              finalEl.appendChild(partialTag);
+            }
+            partialTag.textContent = data.text;
+            finalEl.scrollTop = finalEl.scrollHeight;
+            break;
+
           case "final":
             // Display recognized speech
-            const tag = document.createElement("div");
+            const tag = partialTag || document.createElement("div");
+            partialTag = null;
             tag.className = "tag";
             tag.textContent = data.text;
             finalEl.appendChild(tag);
@@ -638,8 +708,21 @@ document.addEventListener("DOMContentLoaded", function () {
             handleVoiceCommand(cmd);
             break;
 
+          case "device_snapshot":
+          case "device_delta":
+            applyDeviceStates(data);
+            break;
+
           case "device_update":
-            handleDeviceUpdate(data);
+            if (acceptDeviceVersion(data.since, data.version)) handleDeviceUpdate(data);
+            break;
+
+          case "device_updates":
+            // Several devices changed at once (scene, multi-command utterance)
+            if (!acceptDeviceVersion(data.since, data.version)) break;
+            data.updates.forEach((update) =>
+              handleDeviceUpdate({ source: data.source, ...update })
+            );
             break;
 
           case "status":
@@ -676,15 +759,38 @@ document.addEventListener("DOMContentLoaded", function () {
 
     const targetRate = 16000;
     processor.onaudioprocess = (e) => {
-      if (!recording) return;
+      // nothing is sent until the server has told us the audio format
+      if (!recording || !audioFormat) return;
+      if (!socket || socket.readyState !== WebSocket.OPEN) return;
       const input = e.inputBuffer.getChannelData(0);
+
+      if (audioFormat === "opus") {
+        // the encoder takes the mic rate, the server decodes to 16 kHz
+        if (!opusEncoder) opusEncoder = createOpusEncoder(audioCtx.sampleRate);
+        opusEncoder.encode(
+          new AudioData({
+            format: "f32",
+            sampleRate: audioCtx.sampleRate,
+            numberOfFrames: input.length,
+            numberOfChannels: 1,
+            timestamp: opusTimestamp,
+            data: input,
+          })
+        );
+        opusTimestamp += (input.length * 1e6) / audioCtx.sampleRate;
+        return;
+      }
+
       const int16 = downsampleTo16kInt16(
         input,
         audioCtx.sampleRate,
         targetRate
       );
-      if (socket && socket.readyState === WebSocket.OPEN)
-        socket.send(int16.buffer);
+      sendAudioFrame(
+        audioFormat === "mulaw"
+          ? int16ToMulaw(int16)
+          : new Uint8Array(int16.buffer)
+      );
     };
 
     recording = true;
@@ -707,6 +813,12 @@ document.addEventListener("DOMContentLoaded", function () {
       processor.onaudioprocess = null;
       processor = null;
     }
+    if (opusEncoder) {
+      // send what is still buffered in the encoder before closing it
+      const encoder = opusEncoder;
+      opusEncoder = null;
+      encoder.flush().finally(() => encoder.close());
+    }
     if (micStream) {
       micStream.getTracks().forEach((t) => t.stop());
       micStream = null;
@@ -718,6 +830,75 @@ document.addEventListener("DOMContentLoaded", function () {
     log("Recording stopped");
   }
 
+  /* ---------- Helpers: audio transport ---------- */
+  // Opus when the browser can encode it (WebCodecs), else u-law (half of PCM), else PCM
+  async function supportedAudioFormats() {
+    const formats = ["mulaw", "pcm16"];
+    if (window.AudioEncoder) {
+      try {
+        const { supported } = await AudioEncoder.isConfigSupported({
+          codec: "opus",
+          sampleRate: 48000,
+          numberOfChannels: 1,
+        });
+        if (supported) formats.unshift("opus");
+      } catch (e) {
+        // no Opus, the other formats still work
+      }
+    }
+    return formats;
+  }
+
+  function createOpusEncoder(sampleRate) {
+    opusTimestamp = 0;
+    const encoder = new AudioEncoder({
+      // every chunk is one Opus packet, sent as one frame
+      output: (chunk) => {
+        const packet = new Uint8Array(chunk.byteLength);
+        chunk.copyTo(packet);
+        sendAudioFrame(packet);
+      },
+      error: (e) => log("Opus encoder error:", e.message),
+    });
+    encoder.configure({
+      codec: "opus",
+      sampleRate,
+      numberOfChannels: 1,
+      bitrate: 16000,
+      opus: { frameDuration: 20000 },
+    });
+    return encoder;
+  }
+
+  function sendAudioFrame(payload) {
+    if (!socket || socket.readyState !== WebSocket.OPEN) return;
+    const frame = new Uint8Array(4 + payload.length);
+    const header = new DataView(frame.buffer);
+    header.setUint8(0, 1);
+    header.setUint8(1, AUDIO_CODECS[audioFormat]);
+    header.setUint16(2, audioSeq, true);
+    frame.set(payload, 4);
+    audioSeq = (audioSeq + 1) & 0xffff;
+    socket.send(frame.buffer);
+  }
+
+  // G.711 u-law of 16 bit samples, one byte per sample
+  function int16ToMulaw(int16) {
+    const out = new Uint8Array(int16.length);
+    for (let i = 0; i < int16.length; i++) {
+      let sample = int16[i] >> 2;
+      const mask = sample < 0 ? 0x7f : 0xff;
+      if (sample < 0) sample = -sample;
+      sample = Math.min(sample, 8159) + 0x21;
+      let segment = 0;
+      while (segment < 8 && sample >= 0x40 << segment) segment++;
+      const code =
+        segment > 7 ? 0x7f : (segment << 4) | ((sample >> (segment + 1)) & 0x0f);
+      out[i] = code ^ mask;
+    }
+    return out;
+  }
+
   /* ---------- Helper: Downsample 48kHz float32 -> 16kHz int16 ---------- */
   function downsampleTo16kInt16(float32Data, inputRate, targetRate) {
     if (targetRate === inputRate) {